@@ -11,6 +11,7 @@ import sqlite3
 import functools
 
 from schema_generator import dump_db_json_schema
+from unified_text2sql_benchmark.schema_index import write_tables_json
 
 
 def quote_str(s):
@@ -183,7 +184,9 @@ if __name__ == "__main__":
 
     tables = []
     tables.append(dump_db_json_schema(db_file))
-    json.dump(tables, open(os.path.join(output_data_dir, "tables.json"), "w"), indent=2)
+    write_tables_json(
+        tables, os.path.join(output_data_dir, "tables.json"), indent=2
+    )
 
     data_files = []
     for file in os.listdir(original_processed_dir):
@@ -5,9 +5,10 @@
 
 import os
 import json
-import shutil
 from shutil import rmtree
 from schema_generator import dump_db_json_schema
+from unified_text2sql_benchmark.database_store import DatabaseStore
+from unified_text2sql_benchmark.schema_index import write_tables_json
 
 OG_DIR = "original/cosql_dataset/"
 OUTPUT_DIR = "unified/cosql/"
@@ -63,9 +64,10 @@ for file in FILES_TO_CONVERT:
                 json.dump(unified_json_entry, writer)
                 writer.write("\n")
 
-shutil.copytree(
-    OG_DIR + "database", OUTPUT_DIR + "database", dirs_exist_ok=True
-)
+# Databases identical to those of other unified datasets are linked to them.
+database_store = DatabaseStore()
+database_store.copytree(OG_DIR + "database", OUTPUT_DIR + "database")
+database_store.save()
 
 # Re-creating since in the original dataset there is databse (travel_agent)
 # in the tables.json which does not exist in the database folder.
@@ -79,4 +81,4 @@ for db_name in cosql_databases:
     )
     tables.append(dump_db_json_schema(sqlite_file))
 
-json.dump(tables, open(os.path.join(OUTPUT_DIR, "tables.json"), "w"), indent=2)
+write_tables_json(tables, os.path.join(OUTPUT_DIR, "tables.json"), indent=2)
@@ -12,6 +12,8 @@ import string
 import re
 from typing import List
 
+from unified_text2sql_benchmark.schema_index import write_tables_json
+
 
 # most code below is a copy from wikisql2spider.py for convenience
 SQL_KEYWORDS_SET = set(
@@ -516,8 +518,7 @@ def merge_wiki_sql_and_spider_schemas(wiki_sql_path, out_table_path):
         wiki_schema["column_types"].insert(0, "text")
         all_schemas.append(wiki_schema)
 
-    with open(out_table_path, "wt", encoding="utf_8") as out_file:
-        json.dump(all_schemas, out_file)
+    write_tables_json(all_schemas, out_table_path)
 
 
 def get_parser():
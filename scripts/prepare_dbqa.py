@@ -4,6 +4,8 @@ import os
 import json
 import shutil
 
+from unified_text2sql_benchmark.schema_index import build_schema_index
+
 OG_DIR = "original/KaggleDBQA/"
 OUTPUT_DIR = "unified/dbqa/"
 OUTPUT_DEV_FILE = os.path.join(OUTPUT_DIR, "dev.jsonl")
@@ -34,4 +36,5 @@ for file in EXAMPLE_FILES:
             writer.write("\n")
 
 shutil.copy(OG_DIR + "KaggleDBQA_tables.json", OUTPUT_DIR + "tables.json")
+build_schema_index(OUTPUT_DIR + "tables.json")
 shutil.copytree(OG_DIR + "databases", OUTPUT_DIR + "database")
@@ -12,6 +12,7 @@ import shutil
 import sqlite3
 import pandas as pd
 from schema_generator import dump_db_json_schema
+from unified_text2sql_benchmark.schema_index import write_tables_json
 
 
 OG_DIR = "original/fiben-benchmark/"
@@ -62,8 +63,8 @@ conn.executescript(open(SQLITE_COMPATIBLE_SQL_FILE).read())
 
 tables = []
 tables.append(dump_db_json_schema(SQLITE_FILE))
-json.dump(
-    tables, open(os.path.join(UNIFIED_BASE_DIR, "tables.json"), "w"), indent=2
+write_tables_json(
+    tables, os.path.join(UNIFIED_BASE_DIR, "tables.json"), indent=2
 )
 
 table_name_to_column_names = {}
@@ -4,6 +4,8 @@ import os
 import json
 import sqlite3
 from schema_generator import dump_db_json_schema
+from unified_text2sql_benchmark.database_store import DatabaseStore
+from unified_text2sql_benchmark.schema_index import write_tables_json
 
 # Since the original db was in MySql,
 # some aspects of it does not translate directly to sqlite.
@@ -52,12 +54,12 @@ for flavour in NLQ_FLAVORS:
 
     conn = sqlite3.connect(db_path)
     conn.executescript(sqlite_compatible_patients_dump)
+    conn.close()
 
     tables = [dump_db_json_schema(db_path)]
     flavour_dir = UNIFIED_DB_DIR + flavour + "_paraphrase_bench/"
 
-    with open(flavour_dir + "tables.json", "w") as f:
-        json.dump(tables, f, indent=2)
+    write_tables_json(tables, flavour_dir + "tables.json", indent=2)
 
     flavoured_questions = open(
         f"{OG_INPUT_DIR}/{flavour}_source.txt"
@@ -79,3 +81,9 @@ for flavour in NLQ_FLAVORS:
 
             json.dump(unified_json_entry, writer)
             writer.write("\n")
+
+# The databases of all the flavours are identical, keep a single copy.
+database_store = DatabaseStore(UNIFIED_DB_DIR)
+for flavour in NLQ_FLAVORS:
+    database_store.deduplicate(UNIFIED_DB_DIR + flavour + "_paraphrase_bench")
+database_store.save()
@@ -5,6 +5,7 @@ import json
 import shutil
 
 from schema_generator import dump_db_json_schema
+from unified_text2sql_benchmark.schema_index import write_tables_json
 
 
 def extract_nlq_sql_pair(input_file, output_dir):
@@ -49,6 +50,8 @@ if __name__ == "__main__":
 
     tables = []
     tables.append(dump_db_json_schema(output_db_file))
-    json.dump(tables, open(os.path.join(output_dir, "tables.json"), "w"), indent=2)
+    write_tables_json(
+        tables, os.path.join(output_dir, "tables.json"), indent=2
+    )
 
     print(f"Finished.")
@@ -6,6 +6,9 @@ import os
 import json
 import shutil
 
+from unified_text2sql_benchmark.database_store import DatabaseStore
+from unified_text2sql_benchmark.schema_index import build_schema_index
+
 OG_DIR = "original/sparc/"
 OUTPUT_DIR = "unified/sparc/"
 
@@ -56,4 +59,8 @@ for file in FILES_TO_CONVERT:
                 writer.write("\n")
 
 shutil.copy(OG_DIR + "tables.json", OUTPUT_DIR + "tables.json")
-shutil.copytree(OG_DIR + "database", OUTPUT_DIR + "database")
+build_schema_index(OUTPUT_DIR + "tables.json")
+# Databases identical to those of other unified datasets are linked to them.
+database_store = DatabaseStore()
+database_store.copytree(OG_DIR + "database", OUTPUT_DIR + "database")
+database_store.save()
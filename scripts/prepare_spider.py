@@ -3,6 +3,8 @@
 import os
 import json
 
+from unified_text2sql_benchmark.schema_index import build_schema_index
+
 FILES_TO_CONVERT = ["train_spider", "train_others", "dev", "tables"]
 
 INPUT_DIR = "../original/spider/"
@@ -39,3 +41,5 @@ for f_name in FILES_TO_CONVERT:
             with open(OUTPUT_DIR + f_name + ".jsonl", "a+") as writer:
                 json.dump(selected_json_entry, writer)
                 writer.write("\n")
+
+build_schema_index(OUTPUT_DIR + "tables.jsonl")
@@ -4,6 +4,9 @@ import os
 import json
 import shutil
 
+from unified_text2sql_benchmark.database_store import DatabaseStore
+from unified_text2sql_benchmark.schema_index import build_schema_index
+
 OG_DIR = "original/Spider-DK/"
 OUTPUT_DIR = "unified/spider_dk/"
 OUTPUT_TEST_FILE = os.path.join(OUTPUT_DIR, "test.jsonl")
@@ -22,15 +25,15 @@ for entry in input_data:
         writer.write("\n")
 
 shutil.copy(OG_DIR + "tables.json", OUTPUT_DIR + "tables.json")
-shutil.copytree(
-    OG_DIR + "database", OUTPUT_DIR + "database", dirs_exist_ok=True
-)
+build_schema_index(OUTPUT_DIR + "tables.json")
+# Databases identical to those of other unified datasets are linked to them.
+database_store = DatabaseStore()
+database_store.copytree(OG_DIR + "database", OUTPUT_DIR + "database")
 
 # Also copy over all spider databases
 SPIDER_DB_DIR = "original/spider/database/"
 databases = os.listdir(SPIDER_DB_DIR)
 
 for db in databases:
-    shutil.copytree(
-        SPIDER_DB_DIR + db, OUTPUT_DIR + f"database/{db}", dirs_exist_ok=True
-    )
+    database_store.copytree(SPIDER_DB_DIR + db, OUTPUT_DIR + f"database/{db}")
+database_store.save()
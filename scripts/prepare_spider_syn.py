@@ -4,6 +4,9 @@ import os
 import json
 import shutil
 
+from unified_text2sql_benchmark.database_store import DatabaseStore
+from unified_text2sql_benchmark.schema_index import build_schema_index
+
 # Uses the same tables.json and database/ as og spider.
 FILES_TO_CONVERT = ["train_spider", "dev"]
 
@@ -12,13 +15,15 @@ OUTPUT_DIR = "unified/spider_syn/"
 SPIDER_DIR = "unified/spider/"
 
 COPY_FROM_SPIDER = ["database/", "tables.json"]
+# Databases are linked to Spider's rather than copied.
+database_store = DatabaseStore()
 for entry in COPY_FROM_SPIDER:
     if entry.endswith("/"):
-        shutil.copytree(
-            SPIDER_DIR + entry, OUTPUT_DIR + entry, dirs_exist_ok=True
-        )
+        database_store.copytree(SPIDER_DIR + entry, OUTPUT_DIR + entry)
     else:
         shutil.copy(SPIDER_DIR + entry, OUTPUT_DIR + entry)
+        build_schema_index(OUTPUT_DIR + entry)
+database_store.save()
 
 # Cleaning output files.
 for f_name in FILES_TO_CONVERT:
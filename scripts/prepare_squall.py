@@ -8,6 +8,7 @@ import logging
 import sqlite3
 from tqdm import tqdm
 from schema_generator import dump_db_json_schema
+from unified_text2sql_benchmark.schema_index import write_tables_json
 
 logging.basicConfig(level=logging.INFO)
 
@@ -188,8 +189,7 @@ for db in tqdm(dbs):
     unified_db_path = f"{UNIFIED_DATABASE_DIR}/{db_id}/{db_id}.sqlite"
     tables.append(dump_db_json_schema(unified_db_path))
 
-with open(OUTPUT_TABLES_FILE, "w") as f:
-    json.dump(tables, f, indent=2)
+write_tables_json(tables, OUTPUT_TABLES_FILE, indent=2)
 
 # Create train/dev files.
 print("Writing train/dev files.")
@@ -12,6 +12,8 @@ import string
 import re
 import argparse
 
+from unified_text2sql_benchmark.schema_index import write_tables_json
+
 
 SQL_KEYWORDS_SET = set(
     [
@@ -580,8 +582,7 @@ def merge_wiki_sql_and_spider_schemas(
         all_schemas.append(wiki_schema)
 
     table_path = os.path.join(base_dir, "tables.json")
-    with open(table_path, "wt", encoding="utf_8") as out_file:
-        json.dump(all_schemas, out_file)
+    write_tables_json(all_schemas, table_path)
 
 
 def has_number(in_str):
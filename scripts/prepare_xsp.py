@@ -4,21 +4,30 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import hashlib
 import json
 import os
+import re
 import shutil
 import time
-import numpy as np
 import sqlite3
 import timeout_decorator
 import pathlib
 import tensorflow.compat.v1.gfile as gfile
 import csv
 import sqlparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
 
 from scripts.schema_generator import dump_db_json_schema
+from unified_text2sql_benchmark.execution_accuracy import (
+    SCHEMA_INCOHERENCE_STRINGS,
+    SYNTAX_INCORRECTNESS_STRINGS,
+)
+from unified_text2sql_benchmark.schema_index import write_tables_json
 
 ########################################################################################################################
 # Before running this script, make sure to go to https://github.com/google-research/language/tree/master/language/xsp
@@ -102,8 +111,7 @@ def main():
         # Create tables.json
         tables = dump_db_json_schema(db=db_path)
         print(f"Reading {db_path} file and writing out to tables.json.")
-        with open(f"{output_dir}/tables.json", "w+") as f:
-            json.dump([tables], f, indent=2)
+        write_tables_json([tables], f"{output_dir}/tables.json", indent=2)
 
         cache_filepath = f"{mid_dir}/cache.json"
         # Create cache for db:
@@ -116,7 +124,7 @@ def main():
             splits=splits,
         )
 
-        formatted_preds_filename = f"{run}_predictions.json"
+        formatted_preds_filename = f"{run}_predictions.jsonl"
         print(
             f"Storing output gt predictions file to {formatted_preds_filename}"
         )
@@ -130,7 +138,7 @@ def main():
             output_filename=formatted_preds_filename,
         )
 
-        output_eval_filename = "dataset_predictions.txt"
+        output_eval_filename = "dataset_predictions.jsonl"
         print(f"Running eval script, store results to {output_eval_filename}")
         # Run evaluation script to generate table outputs from gold queries
         run_evaluation(
@@ -638,13 +646,32 @@ def gen_predictions(
                     "gold": query,
                     "database_path": f"databases/{run}.db",
                     "empty_database_path": f"empty_databases/{run}.db",
-                    "schema": schema_obj,
+                    "schema_id": run,
                 }
                 out_lines.append(sent_obj)
 
     print(f"  Writing out {output_filename} file for {run}: {count} examples")
-    with open(f"{mid_dir}/{output_filename}", "w+") as o:
-        json.dump(out_lines, o)
+    write_predictions(
+        predictions=out_lines,
+        schemas={run: schema_obj},
+        output_filepath=f"{mid_dir}/{output_filename}",
+    )
+
+
+def write_predictions(predictions, schemas, output_filepath):
+    """Writes predictions as JSONL, storing each schema once by reference.
+
+    Every schema in `schemas` (a mapping from schema id to schema) is written
+    as a `{"schema_id": ..., "schema": ...}` record ahead of the predictions,
+    which only carry the `schema_id` of the database they were made against.
+    """
+    with open(output_filepath, "w+") as o:
+        for schema_id, schema in schemas.items():
+            json.dump({"schema_id": schema_id, "schema": schema}, o)
+            o.write("\n")
+        for prediction in predictions:
+            json.dump(prediction, o)
+            o.write("\n")
 
 
 ########################################################################################################################
@@ -661,34 +688,27 @@ Arguments:
 """
 no_cache = []
 
+# Schemas referenced by `schema_id` in predictions files, shared across runs.
+schema_cache = {}
+
 # Maximum allowable timeout for executing predicted and gold queries.
 TIMEOUT = 60
 
 # Maximum number of candidates we should consider
 MAX_CANDIDATE = 20
 
-# These are substrings of exceptions from sqlite3 that indicate certain classes
-# of schema and syntax errors.
-SCHEMA_INCOHERENCE_STRINGS = {
-    "no such table",
-    "no such column",
-    "ambiguous column name",
-}
-SYNTAX_INCORRECTNESS_STRINGS = {
-    "bad syntax",
-    "unrecognized token",
-    "incomplete input",
-    "misuse of aggregate",
-    "left and right",
-    "wrong number of arguments",
-    "sub-select returns",
-    "1st order by term does not match any column",
-    "no such function",
-    "clause is required before",
-    "incorrect number of bindings",
-    "datatype mismatch",
-    "syntax error",
-}
+# Number of top candidates whose execution on the actual database is started
+# speculatively when candidates are executed in parallel.
+RACING_CANDIDATES = 2
+
+# Default size budget of the predicted-query result cache.
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Number of rows of the predicted and gold tables kept in evaluation records.
+TABLE_HEAD_ROWS = 5
+
+# Buffer size for writing evaluation records and reports.
+WRITE_BUFFER_SIZE = 1 << 20
 
 
 def normalize_sql_str(string):
@@ -711,15 +731,22 @@ def string_acc(s1, s2):
     return normalize_sql_str(s1) == normalize_sql_str(s2)
 
 
-def result_table_to_string(table):
-    """Converts a resulting SQL table to a human-readable string."""
+def result_table_to_string(table, num_rows=None):
+    """Converts a resulting SQL table to a human-readable string.
+
+    `num_rows` is the size of the full table when only its head is given.
+    """
+    if num_rows is None:
+        num_rows = len(table)
     string_val = (
         "\t"
-        + "\n\t".join([str(row) for row in table[: min(len(table), 5)]])
+        + "\n\t".join(
+            [str(row) for row in table[: min(len(table), TABLE_HEAD_ROWS)]]
+        )
         + "\n"
     )
-    if len(table) > 5:
-        string_val += "... and %d more rows.\n" % (len(table) - 5)
+    if num_rows > TABLE_HEAD_ROWS:
+        string_val += "... and %d more rows.\n" % (num_rows - TABLE_HEAD_ROWS)
     return string_val
 
 
@@ -770,6 +797,144 @@ def try_executing_query(
     return pred_results, exception_str, execution_time
 
 
+class QueryResultCache(object):
+    """A bounded LRU cache of predicted-query execution results.
+
+    Entries are keyed by the content hash of the database, the query's
+    `normalize_candidate` form and the case-sensitivity flag, so they stay
+    valid across examples, runs and renamed copies of the same database. The
+    cache is evicted in least-recently-used order to stay within `max_bytes`
+    of (JSON-serialised) results, and can be persisted as JSONL between runs.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+
+    def database_hash(self, database_path):
+        """Returns the content hash of a database file, memoised by stat."""
+        stat = os.stat(database_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            fingerprint = self._fingerprints.get(database_path)
+        if fingerprint is None or fingerprint[0] != signature:
+            digest = hashlib.sha1()
+            with open(database_path, "rb") as infile:
+                for chunk in iter(lambda: infile.read(1 << 20), b""):
+                    digest.update(chunk)
+            fingerprint = (signature, digest.hexdigest())
+            with self._lock:
+                self._fingerprints[database_path] = fingerprint
+        return fingerprint[1]
+
+    def make_key(self, database_path, query, case_sensitive):
+        return "\t".join(
+            [
+                self.database_hash(database_path),
+                str(int(case_sensitive)),
+                normalize_candidate(query),
+            ]
+        )
+
+    def lookup(self, database_path, query, case_sensitive):
+        """Returns the cached (results, exception, 0.0) tuple, or None."""
+        key = self.make_key(database_path, query, case_sensitive)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry[0], entry[1], 0.0
+
+    def store(self, database_path, query, case_sensitive, results, exception):
+        key = self.make_key(database_path, query, case_sensitive)
+        self._put(key, results, exception)
+
+    def _put(self, key, results, exception):
+        size = len(key) + len(json.dumps([results, exception], default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.num_bytes -= self._entries.pop(key)[2]
+            self._entries[key] = (results, exception, size)
+            self.num_bytes += size
+            while self.num_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.num_bytes -= evicted_size
+
+    def load(self, cache_filepath):
+        """Loads entries saved by `save`, keeping their recency order."""
+        with open(cache_filepath) as infile:
+            for line in infile:
+                entry = json.loads(line)
+                self._put(entry["key"], entry["results"], entry["exception"])
+
+    def save(self, cache_filepath):
+        tmp_filepath = cache_filepath + ".tmp"
+        with self._lock, open(
+            tmp_filepath, "w", buffering=WRITE_BUFFER_SIZE
+        ) as ofile:
+            for key, (results, exception, _) in self._entries.items():
+                entry = {
+                    "key": key,
+                    "results": results,
+                    "exception": exception,
+                }
+                ofile.write(json.dumps(entry, default=str) + "\n")
+        os.replace(tmp_filepath, cache_filepath)
+
+
+def try_executing_cached_query(
+    prediction,
+    database_path,
+    cursor,
+    case_sensitive=True,
+    verbose=False,
+    result_cache=None,
+):
+    """Like `try_executing_query`, but memoised in `result_cache` if given.
+
+    If `cursor` is None, a connection to `database_path` is opened for the
+    query, so that it can run on any thread. Timeouts are not cached, since
+    they may not happen again.
+    """
+    if result_cache is not None:
+        cached = result_cache.lookup(database_path, prediction, case_sensitive)
+        if cached is not None:
+            return cached
+
+    if cursor is None:
+        conn = sqlite3.connect(database_path)
+        conn.text_factory = str
+        try:
+            pred_results, exception_str, execution_time = try_executing_query(
+                prediction, conn.cursor(), case_sensitive, verbose
+            )
+        finally:
+            conn.close()
+    else:
+        pred_results, exception_str, execution_time = try_executing_query(
+            prediction, cursor, case_sensitive, verbose
+        )
+    if result_cache is not None and exception_str != "timeout":
+        result_cache.store(
+            database_path,
+            prediction,
+            case_sensitive,
+            pred_results,
+            exception_str,
+        )
+    return pred_results, exception_str, execution_time
+
+
 @timeout_decorator.timeout(seconds=TIMEOUT, use_signals=False)
 def timeout_execute(cursor, prediction):
     cursor.execute(prediction)
@@ -838,8 +1003,260 @@ def col_tab_f1(schema, gold_query, predicted_query):
     )
 
 
+class EvaluationMetrics(object):
+    """Running accumulators for the execution-based evaluation metrics.
+
+    Only counts and sums are kept, so memory does not grow with the number of
+    evaluated examples and the metrics can be reported at any point.
+    """
+
+    FIELDS = [
+        "num_predictions",
+        "exec_correct",
+        "string_correct",
+        "nonempty_pred",
+        "nonempty_pred_correct",
+        "nonempty_gold",
+        "nonempty_gold_correct",
+        "column_f1_sum",
+        "table_f1_sum",
+        "conversion_errors",
+        "schema_errors",
+        "syntax_errors",
+        "timeouts",
+        "gold_errors",
+    ]
+
+    def __init__(self, **counts):
+        for field in self.FIELDS:
+            setattr(self, field, counts.get(field, 0))
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, counts):
+        return cls(**counts)
+
+    def summary(self):
+        """Returns the metrics computed so far, as percentages."""
+
+        def mean(total, count):
+            return total / count if count else float("nan")
+
+        precision = mean(self.nonempty_pred_correct, self.nonempty_pred)
+        recall = mean(self.nonempty_gold_correct, self.nonempty_gold)
+        num = self.num_predictions
+        return {
+            "string_accuracy": 100.0 * mean(self.string_correct, num),
+            "accuracy": 100.0 * mean(self.exec_correct, num),
+            "precision": 100.0 * precision,
+            "nonempty_predicted_tables": self.nonempty_pred,
+            "recall": 100.0 * recall,
+            "nonempty_gold_tables": self.nonempty_gold,
+            "execution_f1": 100.0 * compute_f1(precision, recall),
+            "timeout": 100.0 * mean(self.timeouts, num),
+            "gold_did_not_execute": 100.0 * mean(self.gold_errors, num),
+            "average_column_f1": 100.0 * mean(self.column_f1_sum, num),
+            "average_table_f1": 100.0 * mean(self.table_f1_sum, num),
+            "schema_errors": 100.0 * mean(self.schema_errors, num),
+            "syntax_errors": 100.0 * mean(self.syntax_errors, num),
+            "conversion_errors": 100.0 * mean(self.conversion_errors, num),
+        }
+
+    def write(self, ofile):
+        """Writes the human-readable metrics summary to ofile."""
+        summary = self.summary()
+        ofile.write(
+            "String accuracy: "
+            + "{0:.2f}".format(summary["string_accuracy"])
+            + "\n"
+        )
+        ofile.write(
+            "Accuracy: " + "{0:.2f}".format(summary["accuracy"]) + "\n"
+        )
+        ofile.write(
+            "Precision: "
+            + "{0:.2f}".format(summary["precision"])
+            + " ; "
+            + str(self.nonempty_pred)
+            + " nonempty predicted tables"
+            + "\n"
+        )
+        ofile.write(
+            "Recall: "
+            + "{0:.2f}".format(summary["recall"])
+            + " ; "
+            + str(self.nonempty_gold)
+            + " nonempty gold tables"
+            + "\n"
+        )
+        ofile.write(
+            "Execution F1: "
+            + "{0:.2f}".format(summary["execution_f1"])
+            + "\n"
+        )
+        ofile.write("Timeout: " + "{0:.2f}".format(summary["timeout"]) + "\n")
+        ofile.write(
+            "Gold did not execute: "
+            + "{0:.2f}".format(summary["gold_did_not_execute"])
+            + "\n"
+        )
+        ofile.write(
+            "Average column F1: "
+            + "{0:.2f}".format(summary["average_column_f1"])
+            + "\n"
+        )
+        ofile.write(
+            "Average table F1: "
+            + "{0:.2f}".format(summary["average_table_f1"])
+            + "\n"
+        )
+        ofile.write(
+            "Schema errors: "
+            + "{0:.2f}".format(summary["schema_errors"])
+            + "\n"
+        )
+        ofile.write(
+            "Syntax errors:  "
+            + "{0:.2f}".format(summary["syntax_errors"])
+            + "\n"
+        )
+        ofile.write(
+            "Conversion errors: "
+            + "{0:.2f}".format(summary["conversion_errors"])
+            + "\n"
+        )
+
+
+def normalize_candidate(sql):
+    """Normalizes a candidate query for duplicate detection.
+
+    Unlike `normalize_sql_str`, quoted values are left untouched so that
+    candidates differing only in the case of a value are kept apart.
+    """
+    segments = re.split(r"""('[^']*'|"[^"]*")""", sql.strip().rstrip(";"))
+    return "".join(
+        segment if i % 2 else " ".join(segment.lower().split())
+        for i, segment in enumerate(segments)
+    )
+
+
+def get_candidates(prediction, deduplicate=False):
+    """Returns the top MAX_CANDIDATE predictions, sorted by decreasing score.
+
+    With `deduplicate`, only the highest-scoring of the candidates sharing the
+    same `normalize_candidate` form is kept.
+    """
+    paired_preds_and_scores = zip(
+        prediction["predictions"], prediction["scores"]
+    )
+    sorted_by_scores = sorted(
+        paired_preds_and_scores, key=lambda x: x[1], reverse=True
+    )
+    candidates = [pred for pred, _ in sorted_by_scores[:MAX_CANDIDATE]]
+    if not deduplicate:
+        return candidates
+
+    seen = set()
+    unique_candidates = []
+    for pred in candidates:
+        key = normalize_candidate(pred)
+        if key not in seen:
+            seen.add(key)
+            unique_candidates.append(pred)
+    return unique_candidates
+
+
+def execute_prediction_parallel(
+    prediction, executor, case_sensitive, verbose, result_cache=None
+):
+    """Executes a single example's prediction(s) on a pool of workers.
+
+    Picks the same prediction as `execute_prediction`, but duplicate
+    candidates are collapsed first, the executability of all remaining
+    candidates on the empty database is checked concurrently, and the
+    executions of the RACING_CANDIDATES highest-scoring candidates on the
+    actual database are started right away instead of after their checks.
+
+    Args:
+      prediction: A dictionary containing information for a single example's
+        prediction.
+      executor: A concurrent.futures.Executor to run the queries on.
+      case_sensitive: Boolean indicating whether the execution should be case
+        sensitive with respect to string values.
+      verbose: Whether to print details about what queries are being executed.
+      result_cache: Optional QueryResultCache for the candidates' results.
+
+    Returns:
+      Tuple containing the highest-ranked executable query, the resulting table,
+      and any exception string associated with executing this query.
+    """
+    candidates = get_candidates(prediction, deduplicate=True)
+    if not candidates:
+        return None, None, None, 0
+
+    empty_futures = [
+        executor.submit(
+            try_executing_cached_query,
+            pred,
+            prediction["empty_database_path"],
+            None,
+            case_sensitive,
+            verbose,
+            result_cache,
+        )
+        for pred in candidates
+    ]
+    real_futures = {}
+
+    def execute_real(i):
+        if i not in real_futures:
+            real_futures[i] = executor.submit(
+                try_executing_cached_query,
+                candidates[i],
+                prediction["database_path"],
+                None,
+                case_sensitive,
+                verbose,
+                result_cache,
+            )
+        return real_futures[i]
+
+    for i in range(min(RACING_CANDIDATES, len(candidates))):
+        execute_real(i)
+
+    try:
+        for i, pred in enumerate(candidates):
+            if not empty_futures[i].result()[1]:
+                pred_results, _, execution_time = execute_real(i).result()
+                return pred, pred_results, None, execution_time
+
+            if i == 0:
+                # By default, the prediction is the highest-scoring one. If it
+                # timed out, it technically didn't have a syntax problem.
+                (
+                    top_results,
+                    top_exception,
+                    top_time,
+                ) = execute_real(0).result()
+                if top_exception == "timeout":
+                    return pred, top_results, top_exception, top_time
+
+        return candidates[0], top_results, top_exception, top_time
+    finally:
+        # Queries that already started run to completion in the background.
+        for future in empty_futures + list(real_futures.values()):
+            future.cancel()
+
+
 def execute_prediction(
-    prediction, empty_table_cursor, cursor, case_sensitive, verbose
+    prediction,
+    empty_table_cursor,
+    cursor,
+    case_sensitive,
+    verbose,
+    result_cache=None,
 ):
     """Executes a single example's prediction(s).
 
@@ -855,6 +1272,7 @@ def execute_prediction(
       case_sensitive: Boolean indicating whether the execution should be case
         sensitive with respect to string values.
       verbose: Whether to print details about what queries are being executed.
+      result_cache: Optional QueryResultCache for the candidates' results.
 
     Returns:
       Tuple containing the highest-ranked executable query, the resulting table,
@@ -864,28 +1282,23 @@ def execute_prediction(
     # Go through predictions in order of probability and test their executability
     # until you get an executable prediction. If you don't find one, just
     # "predict" the most probable one.
-    paired_preds_and_scores = zip(
-        prediction["predictions"], prediction["scores"]
-    )
-    sorted_by_scores = sorted(
-        paired_preds_and_scores, key=lambda x: x[1], reverse=True
-    )
-
     best_prediction = None
     pred_results = None
     exception_str = None
     execution_time = 0
 
-    if len(sorted_by_scores) > MAX_CANDIDATE:
-        sorted_by_scores = sorted_by_scores[:MAX_CANDIDATE]
-
-    for i, (pred, _) in enumerate(sorted_by_scores):
+    for i, pred in enumerate(get_candidates(prediction)):
         # Try predicting
         if verbose:
             print("Trying to execute query:\n\t" + pred)
             print("... on empty database")
-        temp_exception_str = try_executing_query(
-            pred, empty_table_cursor, case_sensitive, verbose
+        temp_exception_str = try_executing_cached_query(
+            pred,
+            prediction["empty_database_path"],
+            empty_table_cursor,
+            case_sensitive,
+            verbose,
+            result_cache,
         )[1]
 
         if temp_exception_str:
@@ -901,7 +1314,14 @@ def execute_prediction(
                     pred_results,
                     exception_str,
                     execution_time,
-                ) = try_executing_query(pred, cursor, case_sensitive, verbose)
+                ) = try_executing_cached_query(
+                    pred,
+                    prediction["database_path"],
+                    cursor,
+                    case_sensitive,
+                    verbose,
+                    result_cache,
+                )
             if exception_str == "timeout":
                 # Technically, this query didn't have a syntax problem, so
                 # continue and set this as the best prediction.
@@ -913,7 +1333,14 @@ def execute_prediction(
                     pred_results,
                     exception_str,
                     execution_time,
-                ) = try_executing_query(pred, cursor, case_sensitive, verbose)
+                ) = try_executing_cached_query(
+                    pred,
+                    prediction["database_path"],
+                    cursor,
+                    case_sensitive,
+                    verbose,
+                    result_cache,
+                )
                 break
         else:
             best_prediction = pred
@@ -921,8 +1348,13 @@ def execute_prediction(
 
             if verbose:
                 print("No exception... on actual database")
-            pred_results, _, execution_time = try_executing_query(
-                pred, cursor, case_sensitive, verbose
+            pred_results, _, execution_time = try_executing_cached_query(
+                pred,
+                prediction["database_path"],
+                cursor,
+                case_sensitive,
+                verbose,
+                result_cache,
             )
             break
 
@@ -930,42 +1362,49 @@ def execute_prediction(
 
 
 def execute_predictions(
-    predictions, cache_dict, ofile, case_sensitive, verbose, update_cache
+    predictions,
+    cache_dict,
+    ofile,
+    case_sensitive,
+    verbose,
+    update_cache,
+    metrics=None,
+    progress_callback=None,
+    num_workers=0,
+    result_cache=None,
 ):
     """Executes predicted/gold queries and computes performance.
 
-    Writes results to ofile.
+    Writes one JSON record per example to ofile, followed by a summary record
+    holding the metric counts, and returns the accumulated metrics. Use
+    `render_report` to turn the records into a human-readable report.
 
     Args:
-      predictions: A list of dictionaries defining the predictions made by a
-        model.
+      predictions: An iterable of dictionaries defining the predictions made by
+        a model.
       cache_dict: A dictionary mapping from gold queries to the resulting tables.
-      ofile: A file pointer to be written to.
+      ofile: A (preferably buffered) file pointer to be written to.
       case_sensitive: A Boolean indicating whether execution of queries should be
         case sensitive with respect to strings.
       verbose: Whether to print detailed information about evaluation (e.g., for
         debugging).
       update_cache: Whether to execute and cache gold queries.
+      metrics: Optional EvaluationMetrics to continue accumulating into, e.g.
+        when resuming an interrupted evaluation.
+      progress_callback: Optional function called with the running metrics
+        after every example.
+      num_workers: If positive, candidates are deduplicated and executed on a
+        pool of this many workers with `execute_prediction_parallel`.
+      result_cache: Optional QueryResultCache memoising the execution of
+        predicted queries across examples.
     """
     # Keeps tracks of metrics throughout all of the evaluation.
-    exec_results_same = list()
-    string_same = list()
-
-    precision = list()
-    recall = list()
-
-    column_f1s = list()
-    table_f1s = list()
-
-    conversion_errors = 0
-
-    schema_errors = 0
-    syntax_errors = 0
-    timeouts = 0
-
-    gold_error = 0
+    if metrics is None:
+        metrics = EvaluationMetrics()
 
-    i = 0
+    executor = None
+    if num_workers:
+        executor = ThreadPoolExecutor(max_workers=num_workers)
 
     predictions_iterator = tqdm
     if verbose:
@@ -992,9 +1431,11 @@ def execute_predictions(
         empty_cursor = empty_conn.cursor()
         cursor = conn.cursor()
 
-        ofile.write("Example #" + str(i) + "\n")
         printable_utterance = prediction["utterance"]
-        ofile.write(printable_utterance + "\n")
+        record = {
+            "example": metrics.num_predictions,
+            "utterance": printable_utterance,
+        }
 
         if verbose:
             print(
@@ -1002,45 +1443,56 @@ def execute_predictions(
                 + printable_utterance
             )
 
-        (
-            best_prediction,
-            pred_results,
-            exception_str,
-            execution_time,
-        ) = execute_prediction(
-            prediction, empty_cursor, cursor, case_sensitive, verbose
-        )
-
-        ofile.write("Predicted query:\n")
-        if best_prediction:
-            ofile.write("\t" + best_prediction.strip() + "\n")
+        if executor is not None:
+            (
+                best_prediction,
+                pred_results,
+                exception_str,
+                execution_time,
+            ) = execute_prediction_parallel(
+                prediction, executor, case_sensitive, verbose, result_cache
+            )
         else:
-            ofile.write(
-                "ERROR: Cannot write prediction %r\n" % best_prediction
+            (
+                best_prediction,
+                pred_results,
+                exception_str,
+                execution_time,
+            ) = execute_prediction(
+                prediction,
+                empty_cursor,
+                cursor,
+                case_sensitive,
+                verbose,
+                result_cache,
             )
 
+        record["predicted_query"] = best_prediction
+        record["exception"] = exception_str
+        record["error_type"] = None
+
         # If it didn't execute correctly, check why.
         if exception_str:
-            ofile.write(exception_str + "\n")
-
             found_error = False
             for substring in SCHEMA_INCOHERENCE_STRINGS:
                 if substring in exception_str.lower():
-                    schema_errors += 1
+                    metrics.schema_errors += 1
+                    record["error_type"] = "schema"
                     found_error = True
                     break
 
             if not found_error:
                 for substring in SYNTAX_INCORRECTNESS_STRINGS:
                     if substring in exception_str.lower():
-                        syntax_errors += 1
+                        metrics.syntax_errors += 1
+                        record["error_type"] = "syntax"
                         found_error = True
                         break
 
             if not found_error and "timeout" in exception_str:
-                ofile.write("Execution (predicted) took too long.\n")
+                record["error_type"] = "timeout"
                 found_error = True
-                timeouts += 1
+                metrics.timeouts += 1
 
             # If the error type hasn't been identified, exit and report it.
             if not found_error:
@@ -1054,8 +1506,7 @@ def execute_predictions(
         # Compare to gold and update metrics
         gold_query = prediction["gold"]
 
-        ofile.write("Gold query:\n")
-        ofile.write("\t" + gold_query.strip() + "\n")
+        record["gold_query"] = gold_query
 
         # Get the gold results
         if not case_sensitive:
@@ -1086,7 +1537,7 @@ def execute_predictions(
                     )
 
                     if gold_exception_str:
-                        gold_error += 1
+                        metrics.gold_errors += 1
                         gold_results = []
                     elif cache_dict is not None:
                         cache_dict[gold_query] = gold_results
@@ -1100,14 +1551,16 @@ def execute_predictions(
             no_cache.append(gold_query)
 
         if best_prediction:
-            string_same.append(string_acc(gold_query, best_prediction))
+            metrics.string_correct += int(
+                string_acc(gold_query, best_prediction)
+            )
             col_f1, tab_f1 = col_tab_f1(
                 prediction["schema"], gold_query, best_prediction
             )
-            column_f1s.append(col_f1)
-            table_f1s.append(tab_f1)
-            ofile.write("Column F1: %f\n" % col_f1)
-            ofile.write("Table F1: %f\n" % tab_f1)
+            metrics.column_f1_sum += col_f1
+            metrics.table_f1_sum += tab_f1
+            record["column_f1"] = col_f1
+            record["table_f1"] = tab_f1
 
             if "order by" in gold_query:
                 results_equivalent = pred_results == gold_results
@@ -1128,120 +1581,183 @@ def execute_predictions(
                 results_equivalent = pred_set == gold_set
 
         else:
-            string_same.append(0.0)
-            ofile.write("Column F1: 0.")
-            ofile.write("Table F1: 0.")
-            column_f1s.append(0.0)
-            table_f1s.append(0.0)
+            record["column_f1"] = None
+            record["table_f1"] = None
 
-            conversion_errors += 1
+            metrics.conversion_errors += 1
 
             # Only consider correct if the gold table was empty.
             results_equivalent = gold_results == list()
 
-        exec_results_same.append(int(results_equivalent))
-        ofile.write("Execution was correct? " + str(results_equivalent) + "\n")
+        metrics.exec_correct += int(results_equivalent)
+        record["correct"] = bool(results_equivalent)
 
-        # Add some debugging information about the tables, and compute the
+        # Keep the heads of the tables for debugging, and compute the
         # precisions.
+        record["num_pred_rows"] = len(pred_results) if pred_results else 0
+        record["pred_results"] = (
+            pred_results[:TABLE_HEAD_ROWS] if pred_results else []
+        )
         if pred_results:
-            if not results_equivalent:
-                ofile.write("Predicted table:\n")
-                ofile.write(result_table_to_string(pred_results))
-
-            precision.append(int(results_equivalent))
-        elif best_prediction is None or not results_equivalent:
-            ofile.write("Predicted table was EMPTY!\n")
+            metrics.nonempty_pred += 1
+            metrics.nonempty_pred_correct += int(results_equivalent)
 
+        record["num_gold_rows"] = len(gold_results) if gold_results else 0
+        record["gold_results"] = (
+            gold_results[:TABLE_HEAD_ROWS] if gold_results else []
+        )
         if gold_results:
-            ofile.write("Gold table:\n")
-            ofile.write(result_table_to_string(gold_results))
-
-            recall.append(int(results_equivalent))
-        else:
-            ofile.write("Gold table was EMPTY!\n")
+            metrics.nonempty_gold += 1
+            metrics.nonempty_gold_correct += int(results_equivalent)
 
-        ofile.write("\n")
-        ofile.flush()
+        ofile.write(json.dumps(record, default=str) + "\n")
 
         conn.close()
         empty_conn.close()
 
-        i += 1
+        metrics.num_predictions += 1
+        if progress_callback is not None:
+            progress_callback(metrics)
+
+    if executor is not None:
+        executor.shutdown(wait=False)
 
     # Write the overall metrics to the file.
-    num_empty_pred = len(precision)
-    num_empty_gold = len(recall)
+    ofile.write(json.dumps({"summary": metrics.to_dict()}) + "\n")
+    return metrics
+
+
+def render_report(records_filepath, report_filepath):
+    """Renders evaluation records as the human-readable text report."""
+    with open(records_filepath) as infile, open(
+        report_filepath, "w", buffering=WRITE_BUFFER_SIZE
+    ) as ofile:
+        for line in infile:
+            record = json.loads(line)
+            if "summary" in record:
+                EvaluationMetrics.from_dict(record["summary"]).write(ofile)
+                continue
+
+            ofile.write("Example #" + str(record["example"]) + "\n")
+            ofile.write(record["utterance"] + "\n")
+            ofile.write("Predicted query:\n")
+            best_prediction = record["predicted_query"]
+            if best_prediction:
+                ofile.write("\t" + best_prediction.strip() + "\n")
+            else:
+                ofile.write(
+                    "ERROR: Cannot write prediction %r\n" % best_prediction
+                )
+            if record["exception"]:
+                ofile.write(record["exception"] + "\n")
+                if record["error_type"] == "timeout":
+                    ofile.write("Execution (predicted) took too long.\n")
+
+            ofile.write("Gold query:\n")
+            ofile.write("\t" + record["gold_query"].strip() + "\n")
+
+            if best_prediction:
+                ofile.write("Column F1: %f\n" % record["column_f1"])
+                ofile.write("Table F1: %f\n" % record["table_f1"])
+            else:
+                ofile.write("Column F1: 0.")
+                ofile.write("Table F1: 0.")
 
-    precision = np.mean(np.array(precision))
-    recall = np.mean(np.array(recall))
+            results_equivalent = record["correct"]
+            ofile.write(
+                "Execution was correct? " + str(results_equivalent) + "\n"
+            )
+            if record["num_pred_rows"]:
+                if not results_equivalent:
+                    ofile.write("Predicted table:\n")
+                    ofile.write(
+                        result_table_to_string(
+                            record["pred_results"], record["num_pred_rows"]
+                        )
+                    )
+            elif best_prediction is None or not results_equivalent:
+                ofile.write("Predicted table was EMPTY!\n")
+
+            if record["num_gold_rows"]:
+                ofile.write("Gold table:\n")
+                ofile.write(
+                    result_table_to_string(
+                        record["gold_results"], record["num_gold_rows"]
+                    )
+                )
+            else:
+                ofile.write("Gold table was EMPTY!\n")
 
-    execution_f1 = compute_f1(precision, recall)
+            ofile.write("\n")
 
-    ofile.write(
-        "String accuracy: "
-        + "{0:.2f}".format(100.0 * np.mean(np.array(string_same)))
-        + "\n"
-    )
-    ofile.write(
-        "Accuracy: "
-        + "{0:.2f}".format(100.0 * np.mean(np.array(exec_results_same)))
-        + "\n"
-    )
-    ofile.write(
-        "Precision: "
-        + "{0:.2f}".format(100.0 * precision)
-        + " ; "
-        + str(num_empty_pred)
-        + " nonempty predicted tables"
-        + "\n"
-    )
-    ofile.write(
-        "Recall: "
-        + "{0:.2f}".format(100.0 * recall)
-        + " ; "
-        + str(num_empty_gold)
-        + " nonempty gold tables"
-        + "\n"
-    )
-    ofile.write(
-        "Execution F1: " + "{0:.2f}".format(100.0 * execution_f1) + "\n"
-    )
-    ofile.write(
-        "Timeout: "
-        + "{0:.2f}".format(timeouts * 100.0 / len(predictions))
-        + "\n"
-    )
-    ofile.write(
-        "Gold did not execute: "
-        + "{0:.2f}".format(gold_error * 100.0 / len(predictions))
-        + "\n"
-    )
-    ofile.write(
-        "Average column F1: "
-        + "{0:.2f}".format(100.0 * np.mean(np.array(column_f1s)))
-        + "\n"
-    )
-    ofile.write(
-        "Average table F1: "
-        + "{0:.2f}".format(100.0 * np.mean(np.array(table_f1s)))
-        + "\n"
-    )
-    ofile.write(
-        "Schema errors: "
-        + "{0:.2f}".format((schema_errors) * 100.0 / len(predictions))
-        + "\n"
-    )
-    ofile.write(
-        "Syntax errors:  "
-        + "{0:.2f}".format((syntax_errors) * 100.0 / len(predictions))
-        + "\n"
-    )
-    ofile.write(
-        "Conversion errors: "
-        + "{0:.2f}".format((conversion_errors * 100.0) / len(predictions))
-        + "\n"
-    )
+
+def iter_prediction_records(
+    predictions_filepath, start_offset=0, schema_offsets=None
+):
+    """Lazily reads a JSONL predictions file, resolving schema references.
+
+    Schema records are stored once in `schema_cache` and every prediction gets
+    the cached schema object for its `schema_id` attached.
+
+    Args:
+      predictions_filepath: Path to a JSONL file written by `write_predictions`.
+      start_offset: Byte offset to start reading predictions from.
+      schema_offsets: A dictionary mapping schema ids to the byte offsets of
+        their records. Schemas listed here are (re)loaded before seeking to
+        `start_offset`, and schema records read afterwards are added to it.
+
+    Yields:
+      Tuples of the byte offset right after a prediction and the prediction.
+    """
+    if schema_offsets is None:
+        schema_offsets = {}
+
+    with open(predictions_filepath, "rb") as infile:
+        for schema_id, offset in schema_offsets.items():
+            if schema_id not in schema_cache:
+                infile.seek(offset)
+                record = json.loads(infile.readline())
+                schema_cache[schema_id] = record["schema"]
+
+        infile.seek(start_offset)
+        offset = start_offset
+        for line in iter(infile.readline, b""):
+            line_offset = offset
+            offset += len(line)
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "utterance" not in record:
+                schema_cache[record["schema_id"]] = record["schema"]
+                schema_offsets[record["schema_id"]] = line_offset
+                continue
+            if "schema" not in record:
+                record["schema"] = schema_cache[record["schema_id"]]
+            yield offset, record
+
+
+def read_predictions(predictions_filepath):
+    """Lazily reads predictions from a JSONL or legacy JSON predictions file.
+
+    Legacy JSON files hold a list of predictions with inline schemas and are
+    loaded at once.
+    """
+    if not predictions_filepath.endswith(".jsonl"):
+        with open(predictions_filepath) as infile:
+            for prediction in json.load(infile):
+                yield prediction
+        return
+
+    for _, prediction in iter_prediction_records(predictions_filepath):
+        yield prediction
+
+
+def write_checkpoint(checkpoint_filepath, checkpoint):
+    """Atomically replaces the evaluation checkpoint file."""
+    tmp_filepath = checkpoint_filepath + ".tmp"
+    with open(tmp_filepath, "w") as ofile:
+        json.dump(checkpoint, ofile, indent=2)
+    os.replace(tmp_filepath, checkpoint_filepath)
 
 
 def run_evaluation(
@@ -1250,11 +1766,46 @@ def run_evaluation(
     cache_filepath,
     verbose,
     update_cache,
+    checkpoint_every=0,
+    resume=False,
+    report_filepath=None,
+    num_workers=0,
+    result_cache_filepath=None,
+    result_cache_max_bytes=None,
 ):
-    # Load the predictions filepath.
-    with open(predictions_filepath) as infile:
-        predictions = json.load(infile)
-    # print('Loaded %d predictions.' % len(predictions))
+    """Runs the evaluation over a predictions file.
+
+    Evaluation records are written to `output_filepath` as JSONL and, if
+    `report_filepath` is given, also rendered as a human-readable text report.
+    With `num_workers`, beam candidates are executed in parallel (see
+    `execute_prediction_parallel`).
+
+    Predicted-query results are memoised in a QueryResultCache when
+    `result_cache_filepath` (to persist it between runs) or
+    `result_cache_max_bytes` is given.
+
+    With `checkpoint_every` set, predictions must be in JSONL format: the
+    running metrics are written to `{output_filepath}.partial.json` every
+    `checkpoint_every` examples, together with the byte offsets needed to
+    continue an interrupted run when `resume` is set.
+    """
+    if resume and not checkpoint_every:
+        raise ValueError("Resuming an evaluation requires checkpoint_every")
+    checkpoint_filepath = f"{output_filepath}.partial.json"
+    checkpoint = None
+    if checkpoint_every:
+        if not predictions_filepath.endswith(".jsonl"):
+            raise ValueError(
+                "Checkpointing requires a JSONL predictions file: "
+                + predictions_filepath
+            )
+        if resume and os.path.exists(checkpoint_filepath):
+            with open(checkpoint_filepath) as infile:
+                checkpoint = json.load(infile)
+            print(
+                "Resuming evaluation after %d predictions"
+                % checkpoint["counts"]["num_predictions"]
+            )
 
     # Load or create the cache dictionary mapping from gold queries to resulting
     # tables.
@@ -1273,16 +1824,93 @@ def run_evaluation(
                 cache_dict = json.load(infile)
             # print('Loaded %d cached queries' % len(cache_dict))
 
-    # Create the text file that results will be written to.
-    with open(output_filepath, "w") as ofile:
-        execute_predictions(
-            predictions,
-            cache_dict,
-            ofile,
-            "scholar" not in basefilename,
-            verbose,
-            update_cache,
+    result_cache = None
+    if result_cache_filepath or result_cache_max_bytes:
+        result_cache = QueryResultCache(
+            result_cache_max_bytes or RESULT_CACHE_MAX_BYTES
         )
+        if result_cache_filepath and os.path.exists(result_cache_filepath):
+            result_cache.load(result_cache_filepath)
+
+    if not checkpoint_every:
+        # Create the text file that results will be written to.
+        with open(output_filepath, "w", buffering=WRITE_BUFFER_SIZE) as ofile:
+            execute_predictions(
+                read_predictions(predictions_filepath),
+                cache_dict,
+                ofile,
+                "scholar" not in basefilename,
+                verbose,
+                update_cache,
+                num_workers=num_workers,
+                result_cache=result_cache,
+            )
+    else:
+        if checkpoint is None:
+            checkpoint = {
+                "offset": 0,
+                "output_offset": 0,
+                "schema_offsets": {},
+                "counts": EvaluationMetrics().to_dict(),
+            }
+        schema_offsets = checkpoint["schema_offsets"]
+        position = {"offset": checkpoint["offset"]}
+
+        def predictions():
+            for offset, prediction in iter_prediction_records(
+                predictions_filepath, checkpoint["offset"], schema_offsets
+            ):
+                # Only reached once the previous prediction is fully processed.
+                position["offset"] = offset
+                yield prediction
+
+        # Continue the text file from the last checkpoint, dropping whatever
+        # was written after it.
+        mode = "r+" if checkpoint["output_offset"] else "w"
+        with open(output_filepath, mode, buffering=WRITE_BUFFER_SIZE) as ofile:
+            ofile.seek(checkpoint["output_offset"])
+            ofile.truncate()
+
+            def save_progress(metrics):
+                if metrics.num_predictions % checkpoint_every:
+                    return
+                ofile.flush()
+                write_checkpoint(
+                    checkpoint_filepath,
+                    {
+                        "offset": position["offset"],
+                        "output_offset": ofile.tell(),
+                        "schema_offsets": schema_offsets,
+                        "counts": metrics.to_dict(),
+                        "metrics": metrics.summary(),
+                    },
+                )
+
+            execute_predictions(
+                predictions(),
+                cache_dict,
+                ofile,
+                "scholar" not in basefilename,
+                verbose,
+                update_cache,
+                metrics=EvaluationMetrics.from_dict(checkpoint["counts"]),
+                progress_callback=save_progress,
+                num_workers=num_workers,
+                result_cache=result_cache,
+            )
+        if os.path.exists(checkpoint_filepath):
+            os.remove(checkpoint_filepath)
+
+    if report_filepath:
+        render_report(output_filepath, report_filepath)
+
+    if result_cache is not None:
+        print(
+            "Result cache: %d hits, %d misses"
+            % (result_cache.hits, result_cache.misses)
+        )
+        if result_cache_filepath:
+            result_cache.save(result_cache_filepath)
 
     if "spider" not in basefilename:
         try:
@@ -1312,33 +1940,46 @@ It filters the following:
 - Examples where multiple columns are selected in the resulting table
 
 Usage:
-    The argument is the *_eval.txt file that is generated by
-    official_evaluation.py.
+    The argument is the JSONL evaluation records file that is generated by
+    `run_evaluation`.
 
 """
 
 
-def get_nlqs_to_remove(eval_filename):
+def read_evaluation_records(eval_filename):
+    """Lazily reads the per-example records of an evaluation records file."""
     with open(eval_filename) as infile:
-        examples = infile.read().split("\n\n")
+        for line in infile:
+            record = json.loads(line)
+            if "summary" not in record:
+                yield record
 
+
+def get_nlqs_to_remove(eval_filename):
+    num_examples = 0
     num_exec_correct = 0
     num_filtered = 0
     num_removed = 0
     filtered_utterances = {}
-    for example in examples[:-1]:
-        nlq = example.split("\n")[1]
+    for record in read_evaluation_records(eval_filename):
+        num_examples += 1
+        nlq = record["utterance"]
+        gold_query = record["gold_query"].strip()
 
         # Filter out examples with empty gold tables.
-        if "Gold table was EMPTY!" in example:
+        if not record["num_gold_rows"]:
             filtered_utterances[nlq] = 1
             num_removed += 1
             continue
 
         # Filter out examples with a result of [0] and that require a count.
-        if example.endswith("Gold table:\n\t[0]") and (
-            "gold query:\n\tselect count" in example.lower()
-            or "gold query:\n\tselect distinct count" in example.lower()
+        if (
+            record["num_gold_rows"] == 1
+            and str(record["gold_results"][0]) == "[0]"
+            and (
+                gold_query.lower().startswith("select count")
+                or gold_query.lower().startswith("select distinct count")
+            )
         ):
             filtered_utterances[nlq] = 1
             num_removed += 1
@@ -1346,16 +1987,13 @@ def get_nlqs_to_remove(eval_filename):
 
         # Filter out examples that require copying values that can't be copied.
         prev_value = ""
-        example_lines = example.split("\n")
         last_quote = ""
-        gold_query_idx = example_lines.index("Gold query:") + 1
-        utterance = example_lines[1]
+        utterance = nlq
         copiable = True
         in_equality = False
         numerical_value = ""
         handled_prefix = False
         too_many_selects = False
-        gold_query = example_lines[gold_query_idx].strip()
 
         for i, char in enumerate(gold_query):
             # Check that it's only selecting a single table at the top
@@ -1411,12 +2049,10 @@ def get_nlqs_to_remove(eval_filename):
 
         num_filtered += 1
 
-        if "Execution was correct? True" in example:
+        if record["correct"]:
             num_exec_correct += 1
 
-    print(
-        "Filtered from %d to %d examples" % (len(examples) - 1, num_filtered)
-    )
+    print("Filtered from %d to %d examples" % (num_examples, num_filtered))
     print(f"Removed {num_removed} examples")
     return filtered_utterances
 
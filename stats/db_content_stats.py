@@ -0,0 +1,228 @@
+import os
+import glob
+import json
+import sqlite3
+import argparse
+from tqdm import tqdm
+from multiprocessing import Pool
+from pandas import DataFrame
+
+STATS_OUTPUT_DIR = "stats/output"
+STATS_CACHE_DIR = "stats/cache"
+UNIFIED_DIR = "unified"
+
+CACHE_FILE = f"{STATS_CACHE_DIR}/db_content_stats.json"
+
+# Tables with more rows are sampled down to about this many rows, if sampling is enabled.
+SAMPLE_ROWS = 100000
+
+# Resolution of the sampling fraction.
+SAMPLE_RESOLUTION = 1000000
+
+
+def quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def get_table_stats(cursor, table, sample_rows=None):
+    """Returns the row count of a table and the distinct count and null rate of its columns.
+
+    Column statistics are computed in one aggregate query. Tables with more than
+    `sample_rows` rows are sampled with a Bernoulli sample of about that many rows.
+    """
+    row_count = cursor.execute(f"SELECT COUNT(*) FROM {quote(table)}").fetchone()[0]
+    columns = [
+        (column[1], column[2])
+        for column in cursor.execute(f"PRAGMA table_info({quote(table)})").fetchall()
+    ]
+
+    source = quote(table)
+    sampled = bool(sample_rows) and row_count > sample_rows
+    if sampled:
+        threshold = max(1, int(SAMPLE_RESOLUTION * sample_rows / row_count))
+        source = (
+            f"(SELECT * FROM {quote(table)} "
+            f"WHERE abs(random() % {SAMPLE_RESOLUTION}) < {threshold})"
+        )
+
+    column_stats = []
+    if columns:
+        aggregates = ["COUNT(*)"]
+        for name, _ in columns:
+            aggregates.append(f"COUNT(DISTINCT {quote(name)})")
+            aggregates.append(f"SUM({quote(name)} IS NULL)")
+        result = cursor.execute(f"SELECT {', '.join(aggregates)} FROM {source}").fetchone()
+
+        scanned_rows = result[0]
+        for i, (name, column_type) in enumerate(columns):
+            nulls = result[2 + 2 * i] or 0
+            column_stats.append(
+                {
+                    "column": name,
+                    "type": column_type,
+                    "distinct_count": result[1 + 2 * i],
+                    "null_rate": round(nulls / scanned_rows, 4) if scanned_rows else 0.0,
+                }
+            )
+
+    return {"rows": row_count, "sampled": sampled, "columns": column_stats}
+
+
+def get_db_content_stats(path, sample_rows=None):
+    """Returns the file size and the statistics of every table of an SQLite database."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = conn.cursor()
+        tables = [
+            row[0]
+            for row in cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            ).fetchall()
+        ]
+        return {
+            "file_size": os.path.getsize(path),
+            "tables": {table: get_table_stats(cursor, table, sample_rows) for table in tables},
+        }
+    finally:
+        conn.close()
+
+
+def collect_db(work_unit):
+    path, sample_rows = work_unit
+    try:
+        return path, get_db_content_stats(path, sample_rows), None
+    except sqlite3.Error as e:
+        return path, None, str(e)
+
+
+def load_cache(cache_file):
+    if os.path.exists(cache_file):
+        with open(cache_file) as reader:
+            return json.load(reader)
+    return {}
+
+
+def save_cache(cache, cache_file):
+    os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+    with open(f"{cache_file}.tmp", "w") as writer:
+        json.dump(cache, writer)
+    os.replace(f"{cache_file}.tmp", cache_file)
+
+
+def collect_db_content_statistics(workers=None, sample_rows=None, cache_file=CACHE_FILE):
+    """Writes the content statistics of every unified SQLite database.
+
+    Databases are scanned on a pool of `workers` processes, and their statistics
+    are cached by file size and modification time, so only new or changed
+    databases are scanned again. `db_content_stats.csv` has one row per database,
+    and `db_column_stats.csv` one row per column.
+    """
+    cache = load_cache(cache_file)
+    paths = sorted(glob.glob(f"{UNIFIED_DIR}/*/database/*/*.sqlite"))
+
+    stats = {}
+    work_units = []
+    for path in paths:
+        entry = cache.get(path)
+        if (
+            entry is not None
+            and entry["fingerprint"] == file_fingerprint(path)
+            and entry["sample_rows"] == sample_rows
+        ):
+            stats[path] = entry["stats"]
+        else:
+            work_units.append((path, sample_rows))
+
+    with Pool(workers) as pool:
+        for path, db_stats, error in tqdm(
+            pool.imap_unordered(collect_db, work_units),
+            total=len(work_units),
+            desc="Scanning databases",
+        ):
+            if error:
+                print(f"Could not read {path}: {error}")
+                continue
+            stats[path] = db_stats
+            cache[path] = {
+                "fingerprint": file_fingerprint(path),
+                "sample_rows": sample_rows,
+                "stats": db_stats,
+            }
+
+    cache = {path: entry for path, entry in cache.items() if os.path.exists(path)}
+    save_cache(cache, cache_file)
+
+    db_rows = []
+    column_rows = []
+    for path in paths:
+        if path not in stats:
+            continue
+
+        dataset = os.path.relpath(path, UNIFIED_DIR).split(os.sep)[0]
+        db_id = os.path.basename(os.path.dirname(path))
+        tables = stats[path]["tables"]
+        columns = [column for table in tables.values() for column in table["columns"]]
+        largest_table = max(tables, key=lambda table: tables[table]["rows"], default=None)
+
+        db_rows.append(
+            {
+                "dataset": dataset,
+                "db_id": db_id,
+                "file_size": stats[path]["file_size"],
+                "tables": len(tables),
+                "columns": len(columns),
+                "rows": sum(table["rows"] for table in tables.values()),
+                "largest_table": largest_table,
+                "largest_table_rows": tables[largest_table]["rows"] if largest_table else 0,
+                "avg_null_rate": round(
+                    sum(column["null_rate"] for column in columns) / (len(columns) or 1), 4
+                ),
+                "sampled_tables": sum(table["sampled"] for table in tables.values()),
+            }
+        )
+        for table, table_stats in tables.items():
+            for column in table_stats["columns"]:
+                column_rows.append(
+                    {
+                        "dataset": dataset,
+                        "db_id": db_id,
+                        "table": table,
+                        "rows": table_stats["rows"],
+                        "sampled": table_stats["sampled"],
+                        **column,
+                    }
+                )
+
+    DataFrame(db_rows).to_csv(f"{STATS_OUTPUT_DIR}/db_content_stats.csv")
+    DataFrame(column_rows).to_csv(f"{STATS_OUTPUT_DIR}/db_column_stats.csv")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of processes scanning databases (defaults to the number of CPUs)",
+        default=None,
+    )
+    parser.add_argument(
+        "--sample_rows",
+        type=int,
+        nargs="?",
+        const=SAMPLE_ROWS,
+        help=f"sample tables down to about this many rows ({SAMPLE_ROWS} if no value is "
+        "given), by default every row is scanned",
+        default=None,
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    os.makedirs(STATS_OUTPUT_DIR, exist_ok=True)
+    collect_db_content_statistics(workers=args.workers, sample_rows=args.sample_rows)
@@ -3,66 +3,68 @@
 import os
 import json
 import numpy
+import random
+import argparse
 from tqdm import tqdm
-from pandas import json_normalize
-from collections import defaultdict
+from itertools import islice
+from multiprocessing import Pool
+from contextlib import nullcontext
+from pandas import DataFrame, concat, factorize, json_normalize
 from time import time, strftime, gmtime
-from sqlglot import parse_one, exp, transpile
+from parse_cache import ParseCache
+from sql_patterns import sql_fingerprint, render_pattern
+from query_features import FEATURE_COLUMNS, query_features
+from sampling import reservoir_sample, z_score, mean_interval, gee_cardinality
+from sketches import PatternSketch, PatternSketches
+from unified_text2sql_benchmark.compressed_jsonl import iter_lines
+from unified_text2sql_benchmark.dataset import split_files
 
 STATS_OUTPUT_DIR = "stats/output"
 STATS_ERRORS_DIR = f"stats/parsing_errors"
+STATS_CACHE_DIR = "stats/cache"
 
 os.makedirs(STATS_OUTPUT_DIR, exist_ok=True)
 os.makedirs(STATS_ERRORS_DIR, exist_ok=True)
 
 UNIFIED_DIR = "unified"
 ALL_DATABASES = os.listdir(UNIFIED_DIR)
+UNIFIED_JSONL_FILES = ["test.jsonl", "train.jsonl", "dev.jsonl"]
+UNIFIED_SPLITS = [content.split(".jsonl")[0] for content in UNIFIED_JSONL_FILES]
 
+FEATURES_FILE = f"{STATS_OUTPUT_DIR}/query_features.parquet"
+SKETCHES_FILE = f"{STATS_OUTPUT_DIR}/sql_pattern_sketches.json"
+SKETCH_SUMMARY_FILE = f"{STATS_OUTPUT_DIR}/sql_pattern_sketch_summary.json"
+PATTERN_IDS_FILE = f"{STATS_OUTPUT_DIR}/sql_pattern_ids.npz"
+PATTERN_VOCABULARY_FILE = f"{STATS_OUTPUT_DIR}/sql_pattern_vocabulary.json"
+FEATURE_TABLE_COLUMNS = [
+    "dataset",
+    "split",
+    "index",
+    "parsing_error",
+    "sql_pattern",
+    "unified_sql_pattern",
+    *FEATURE_COLUMNS,
+]
 
-def get_nlq_stats(jsonl_content, dataset):
-    nlq_level_join_count = []
-    nlq_level_select_count = []
-    nlq_level_nest_level = []
-    sqlglot_parsing_errors = 0
-    count = 0
+# Number of jsonl lines per work unit of the statistics collection.
+CHUNK_SIZE = 2000
 
-    for line in jsonl_content:
-        query = json.loads(line)["query"]
-
-        try:
-            transpile(query)
-        except Exception as e:
-            error_file = f"{STATS_ERRORS_DIR}/{dataset}"
-            if os.path.exists(error_file):
-                os.unlink(error_file)
+# Confidence level of the intervals of the approximate statistics.
+CONFIDENCE = 0.95
 
-            with open(error_file, "a+") as writer:
-                writer.write(f"{query} \n {str(e)} \n\n")
+# Every distinct query is parsed once, and shared by all the passes below.
+parse_cache = ParseCache(f"{STATS_CACHE_DIR}/parse_cache.sqlite")
 
-            sqlglot_parsing_errors += 1
-            continue
 
-        count += 1
-        parsed_query = parse_one(query)
+def write_parsing_errors(dataset, errors):
+    error_file = f"{STATS_ERRORS_DIR}/{dataset}"
+    if os.path.exists(error_file):
+        os.unlink(error_file)
 
-        join_count = sum(1 for _ in parsed_query.find_all(exp.Join))
-        select_count = sum(1 for _ in parsed_query.find_all(exp.Select))
-        intersect_count = sum(1 for _ in parsed_query.find_all(exp.Intersect))
-        except_count = sum(1 for _ in parsed_query.find_all(exp.Except))
-
-        nest_level = select_count - (intersect_count + except_count)
-
-        nlq_level_join_count.append(join_count)
-        nlq_level_select_count.append(select_count)
-        nlq_level_nest_level.append(nest_level)
-
-    return {
-        "total_nlqs": count,
-        "parsing_errors": sqlglot_parsing_errors,
-        "join_counts": round(sum(nlq_level_join_count) / count, 2),
-        "select_counts": round(sum(nlq_level_select_count) / count, 2),
-        "nest_levels": round(sum(nlq_level_nest_level) / count, 2),
-    }
+    if errors:
+        with open(error_file, "w") as writer:
+            for query, error in errors:
+                writer.write(f"{query} \n {error} \n\n")
 
 
 def get_schema_stats(schema):
@@ -91,72 +93,298 @@ def get_schema_stats(schema):
     }
 
 
-def normalizer(node):
-    if isinstance(node, exp.Column):
-        return parse_one("PLACEHOLDER_COLUMN")
-    elif isinstance(node, exp.Table):
-        return parse_one("PLACEHOLDER_TABLE")
-    elif isinstance(node, exp.Literal):
-        return parse_one("PLACEHOLDER_LITERAL")
-    elif type(node) in [
-        exp.Count,
-        exp.Sum,
-        exp.Min,
-        exp.Max,
-        exp.Avg,
-        exp.Quantile,
-        exp.Stddev,
-        exp.StddevPop,
-        exp.StddevSamp,
-    ]:
-        return parse_one("PLACEHOLDER_AGG")
-    elif type(node) in [exp.LT, exp.LTE, exp.GT, exp.GTE]:
-        return parse_one("PLACEHOLDER_COMPARISON")
-    return node
-
-
-def noramlize_sql(parsed_sql):
-    return parsed_sql.transform(normalizer).sql()
-
-
-def get_redundancy_stats(jsonl_content):
-    count = 0
-    distinct_sql_patterns = defaultdict(list)
-
-    for line in jsonl_content:
+def add_unified_pattern(parsed_query, displays):
+    """Returns the unified pattern fingerprint of a query, rendering it if it is new."""
+    fingerprint = sql_fingerprint(parsed_query, join_aware=True)
+    if fingerprint not in displays:
+        displays[fingerprint] = render_pattern(parsed_query, join_aware=True)
+    return fingerprint
+
+
+def iter_work_units(chunk_size, sample_size=None, seed=0, populations=None):
+    """Yields (dataset, split, [(line index, line), ...]) chunks of every split.
+
+    Splits are read from `{split}.jsonl`, or `{split}.jsonl.zst` without it. With
+    `sample_size`, only a uniform sample of that many lines of every split is
+    yielded, and the number of lines of every (dataset, split) is stored in
+    `populations`.
+    """
+    for dataset in ALL_DATABASES:
+        for split, path in split_files(f"{UNIFIED_DIR}/{dataset}").items():
+            reader = iter_lines(path)
+            if sample_size:
+                rng = random.Random(f"{seed}/{dataset}/{split}.jsonl")
+                population, lines = reservoir_sample(reader, sample_size, rng)
+                populations[(dataset, split)] = population
+                lines = iter(lines)
+            else:
+                lines = enumerate(reader)
+
+            while True:
+                chunk = list(islice(lines, chunk_size))
+                if not chunk:
+                    break
+                yield dataset, split, chunk
+
+
+def collect_chunk_statistics(work_unit):
+    """Computes the features and SQL patterns of every query of a chunk.
+
+    Returns the chunk's rows of the feature table, its parsing errors, the display
+    strings of its unified patterns, and the number of queries parsed.
+    """
+    dataset, split, lines = work_unit
+    parses = parse_cache.parses
+    rows = []
+    errors = []
+    displays = {}
+
+    for index, line in lines:
         query = json.loads(line)["query"]
-
-        try:
-            transpile(query)
-        except Exception as e:
-            print(f"Could not transpile: {query}\n{e}")
-            continue
-
-        count += 1
-        parsed_query = parse_one(query)
-        distinct_sql_patterns[noramlize_sql(parsed_query)].append(query)
-        max_queries_per_pattern = max(len(queries) for queries in distinct_sql_patterns.values())
-        standard_deviation_of_queries_per_pattern = numpy.std(
-            [len(queries) for queries in distinct_sql_patterns.values()]
+        parsed_query, error = parse_cache.parse(query)
+        row = dict.fromkeys(FEATURE_TABLE_COLUMNS)
+        row.update(dataset=dataset, split=split, index=index, parsing_error=error is not None)
+
+        if parsed_query is not None:
+            try:
+                row["unified_sql_pattern"] = add_unified_pattern(parsed_query, displays)
+            except Exception as e:
+                print(f"Exception transforming: {parsed_query}: {e}")
+
+        if error:
+            print(f"Could not transpile: {query}\n{error}")
+            errors.append((query, error))
+        else:
+            row["sql_pattern"] = sql_fingerprint(parsed_query)
+            row.update(query_features(parsed_query))
+        rows.append(row)
+
+    parse_cache.flush()
+    parses = parse_cache.parses - parses
+    return DataFrame(rows, columns=FEATURE_TABLE_COLUMNS), errors, displays, parses
+
+
+def collect_query_features(workers=1, chunk_size=CHUNK_SIZE, sample_size=None, seed=0):
+    """Returns the feature table of every query, its parsing errors per dataset, the
+    display strings of the unified SQL patterns, and the number of lines per split
+    if sampling (None otherwise).
+
+    Every split is read in chunks of `chunk_size` lines, which are processed on a
+    pool of `workers` processes and concatenated back in order. With
+    `sample_size`, only a uniform sample of that many lines of every split is read.
+    """
+    chunks = []
+    errors = {}
+    displays = {}
+    populations = None
+
+    with Pool(workers) if workers > 1 else nullcontext() as pool:
+        if sample_size:
+            # Samples are small, and every split must be sampled for its size to be known.
+            populations = {}
+            work_units = list(iter_work_units(chunk_size, sample_size, seed, populations))
+        else:
+            work_units = iter_work_units(chunk_size)
+        if pool is None:
+            results = map(collect_chunk_statistics, work_units)
+        else:
+            results = pool.imap(collect_chunk_statistics, work_units)
+
+        for chunk, chunk_errors, chunk_displays, parses in tqdm(
+            results, desc="Collecting statistics"
+        ):
+            if pool is not None:
+                parse_cache.parses += parses
+            if len(chunk):
+                chunks.append(chunk)
+                errors.setdefault(chunk["dataset"].iat[0], []).extend(chunk_errors)
+            for fingerprint, display in chunk_displays.items():
+                displays.setdefault(fingerprint, display)
+
+    if chunks:
+        features = concat(chunks, ignore_index=True)
+    else:
+        features = DataFrame(columns=FEATURE_TABLE_COLUMNS)
+    for column in FEATURE_COLUMNS:
+        if column != "hardness":
+            features[column] = features[column].astype("Int64")
+    features["parsing_error"] = features["parsing_error"].astype(bool)
+    return features, errors, displays, populations
+
+
+def write_features(features, features_file):
+    """Writes the feature table as Parquet, or as an Arrow IPC file for .arrow/.feather."""
+    if features_file.endswith((".arrow", ".feather")):
+        features.to_feather(features_file)
+    else:
+        features.to_parquet(features_file, index=False)
+
+
+def population_std(values):
+    return numpy.std(values.to_numpy())
+
+
+def get_nlq_stats(features):
+    """Returns the NLQ level statistics of every (dataset, split) of the feature table."""
+    keys = ["dataset", "split"]
+    sums = (
+        features[~features["parsing_error"]]
+        .groupby(keys, sort=False)
+        .agg(
+            total_nlqs=("index", "size"),
+            join_count=("joins", "sum"),
+            select_count=("selects", "sum"),
+            nest_level=("nest_level", "sum"),
         )
+    )
+    parsing_errors = features.groupby(keys, sort=False)["parsing_error"].sum()
+    sums = sums.reindex(parsing_errors.index, fill_value=0)
+
+    nlq_stats = {}
+    for key, row in sums.iterrows():
+        count = int(row["total_nlqs"]) or 1
+        nlq_stats[key] = {
+            "total_nlqs": int(row["total_nlqs"]),
+            "parsing_errors": int(parsing_errors[key]),
+            "join_counts": round(int(row["join_count"]) / count, 2),
+            "select_counts": round(int(row["select_count"]) / count, 2),
+            "nest_levels": round(int(row["nest_level"]) / count, 2),
+        }
+    return nlq_stats
+
+
+def get_redundancy_stats(features):
+    """Returns the SQL pattern redundancy statistics of every (dataset, split)."""
+    patterns = (
+        features.dropna(subset=["sql_pattern"])
+        .groupby(["dataset", "split", "sql_pattern"], sort=False)
+        .size()
+    )
+    summaries = patterns.groupby(level=["dataset", "split"], sort=False).agg(
+        ["sum", "size", "max", population_std]
+    )
 
-    return {
-        "nlqs": count,
-        "unique_sql_patterns": len(distinct_sql_patterns),
-        "total_nlqs_by_unique_patterns": round(count / len(distinct_sql_patterns), 2),
-        "max_queries_per_pattern": max_queries_per_pattern,
-        "std_dev_queries_per_pattern": round(standard_deviation_of_queries_per_pattern, 2),
-    }
+    redundancy_stats = {}
+    for key, row in summaries.iterrows():
+        count = int(row["sum"])
+        unique_sql_patterns = int(row["size"])
+        redundancy_stats[key] = {
+            "nlqs": count,
+            "unique_sql_patterns": unique_sql_patterns,
+            "total_nlqs_by_unique_patterns": round(count / unique_sql_patterns, 2),
+            "max_queries_per_pattern": int(row["max"]),
+            "std_dev_queries_per_pattern": round(row["population_std"], 2),
+        }
+    return redundancy_stats
+
+
+def split_scales(features, populations):
+    """Returns the number of lines of every split over the number of sampled lines."""
+    samples = features.groupby(["dataset", "split"], sort=False).size()
+    return {key: populations[key] / sample for key, sample in samples.items()}
+
+
+def get_approximate_nlq_stats(features, populations, confidence=CONFIDENCE):
+    """Returns the NLQ level statistics of every (dataset, split) estimated from a
+    sample of its queries, with a confidence interval on every average.
+    """
+    z = z_score(confidence)
+    scales = split_scales(features, populations)
+
+    nlq_stats = {}
+    for key, split_features in features.groupby(["dataset", "split"], sort=False):
+        parsed = split_features[~split_features["parsing_error"]]
+        errors = len(split_features) - len(parsed)
+        total_nlqs = len(parsed) * scales[key]
+
+        stats = {
+            "total_nlqs": round(total_nlqs),
+            "parsing_errors": round(errors * scales[key]),
+            "sampled_nlqs": len(split_features),
+        }
+        for name, column in [
+            ("join_counts", "joins"),
+            ("select_counts", "selects"),
+            ("nest_levels", "nest_level"),
+        ]:
+            mean, low, high = mean_interval(parsed[column].to_numpy(dtype=float), total_nlqs, z)
+            stats[name] = round(mean, 2)
+            stats[f"{name}_ci_low"] = round(low, 2)
+            stats[f"{name}_ci_high"] = round(high, 2)
+        nlq_stats[key] = stats
+    return nlq_stats
+
+
+def get_approximate_redundancy_stats(features, populations):
+    """Returns the SQL pattern redundancy statistics of every (dataset, split)
+    estimated from a sample of its queries.
+
+    The number of distinct patterns is estimated with `gee_cardinality`, and its
+    bounds give the interval of the number of queries per pattern. The maximum and
+    standard deviation of the queries per pattern are scaled from the sample.
+    """
+    scales = split_scales(features, populations)
+    patterns = (
+        features.dropna(subset=["sql_pattern"])
+        .groupby(["dataset", "split", "sql_pattern"], sort=False)
+        .size()
+    )
 
+    redundancy_stats = {}
+    for key, counts in patterns.groupby(level=["dataset", "split"], sort=False):
+        counts = counts.to_numpy()
+        scale = scales[key]
+        count = round(int(counts.sum()) * scale)
+        unique_sql_patterns, low, high = gee_cardinality(counts, scale)
+        redundancy_stats[key] = {
+            "nlqs": count,
+            "unique_sql_patterns": round(unique_sql_patterns),
+            "unique_sql_patterns_ci_low": low,
+            "unique_sql_patterns_ci_high": round(high),
+            "total_nlqs_by_unique_patterns": round(count / unique_sql_patterns, 2),
+            "total_nlqs_by_unique_patterns_ci_low": round(count / high, 2),
+            "total_nlqs_by_unique_patterns_ci_high": round(count / low, 2),
+            "max_queries_per_pattern": round(int(counts.max()) * scale),
+            "std_dev_queries_per_pattern": round(float(numpy.std(counts)) * scale, 2),
+        }
+    return redundancy_stats
+
+
+EMPTY_NLQ_STATS = {
+    "total_nlqs": 0,
+    "parsing_errors": 0,
+    "join_counts": 0.0,
+    "select_counts": 0.0,
+    "nest_levels": 0.0,
+}
+EMPTY_REDUNDANCY_STATS = {
+    "nlqs": 0,
+    "unique_sql_patterns": 0,
+    "total_nlqs_by_unique_patterns": 0,
+    "max_queries_per_pattern": 0,
+    "std_dev_queries_per_pattern": 0,
+}
+
+
+def collect_dataset_level_statistics(features, errors, populations=None, confidence=CONFIDENCE):
+    """Writes the schema, NLQ and redundancy statistics of every dataset.
+
+    If `populations` is given, the features are of a sample of every split, and
+    the statistics are estimated with confidence intervals.
+    """
+    if populations is None:
+        nlq_stats = get_nlq_stats(features)
+        redundancy_stats = get_redundancy_stats(features)
+    else:
+        nlq_stats = get_approximate_nlq_stats(features, populations, confidence)
+        redundancy_stats = get_approximate_redundancy_stats(features, populations)
 
-def collect_dataset_level_statistics():
     all_schema_stats = []
     all_nlq_stats = []
     all_redundancy_stats = []
 
     # Schema and NLQ statistics
-    for dataset in tqdm(ALL_DATABASES, position=0, leave=True):
-        print(f"Getting stats for {dataset}")
+    for dataset in ALL_DATABASES:
         DATASET_CONTENT_DIR = f"{UNIFIED_DIR}/{dataset}"
 
         db_nlq_stats = {}
@@ -172,16 +400,13 @@ def collect_dataset_level_statistics():
                 db_schema_stats.update(get_schema_stats(open(f"{DATASET_CONTENT_DIR}/{content}")))
                 all_schema_stats.append(db_schema_stats)
 
-            if content.endswith(".jsonl"):
-                split = content.split(".jsonl")[0]
-
-                db_nlq_stats[split] = get_nlq_stats(
-                    open(f"{DATASET_CONTENT_DIR}/{content}"), dataset
-                )
-                db_redundancy_stats[split] = get_redundancy_stats(
-                    open(f"{DATASET_CONTENT_DIR}/{content}")
-                )
+        for split in split_files(DATASET_CONTENT_DIR):
+            db_nlq_stats[split] = nlq_stats.get((dataset, split), EMPTY_NLQ_STATS)
+            db_redundancy_stats[split] = redundancy_stats.get(
+                (dataset, split), EMPTY_REDUNDANCY_STATS
+            )
 
+        write_parsing_errors(dataset, errors.get(dataset, []))
         all_nlq_stats.append(db_nlq_stats)
         all_redundancy_stats.append(db_redundancy_stats)
 
@@ -197,51 +422,199 @@ def collect_dataset_level_statistics():
     redundancy_stats_df.to_csv(f"{STATS_OUTPUT_DIR}/redundancy_stats.csv")
 
 
-def collect_unified_statisitcs():
-    unified_stats = defaultdict(int)
+def collect_unified_statisitcs(features=None, displays=None, populations=None):
+    """Writes the unified SQL patterns, collecting the feature table first if not given.
 
-    all_nlq_count = 0
-    jsonl_files = ["test.jsonl", "train.jsonl", "dev.jsonl"]
-    for dataset in tqdm(ALL_DATABASES):
-        DATASET_CONTENT_DIR = f"{UNIFIED_DIR}/{dataset}"
+    If `populations` is given, the features are of a sample of every split, and
+    every sampled query counts for the lines of its split over the sampled ones.
+    """
+    if features is None:
+        features, _, displays, populations = collect_query_features()
+    if populations is not None:
+        scales = split_scales(features, populations)
 
-        for content in os.listdir(DATASET_CONTENT_DIR):
-            if content in jsonl_files:
-                with open(f"{DATASET_CONTENT_DIR}/{content}", "r") as reader:
-                    for line in reader.readlines():
-                        line = json.loads(line)
-
-                        try:
-                            all_nlq_count += 1
-                            parsed_query = parse_one(line["query"])
-
-                            normalized_sql = noramlize_sql(parsed_query)
-                            normalized_sql = normalized_sql.replace(
-                                "PLACEHOLDER_COLUMN = PLACEHOLDER_COLUMN",
-                                "PLACEHOLDER_COLUMN = PLACEHOLDER_LITERAL",
-                            )
-                            # Revert back for JOIN clause equalities.
-                            normalized_sql = normalized_sql.replace(
-                                "ON PLACEHOLDER_COLUMN = PLACEHOLDER_LITERAL",
-                                "PLACEHOLDER_COLUMN = PLACEHOLDER_COLUMN",
-                            )
-
-                            unified_stats[normalized_sql] += 1
-                        except Exception as e:
-                            print(f"Exception transforming: {parsed_query}: {e}")
-                            continue
-
-    unified_stats = dict(sorted(unified_stats.items(), key=lambda item: -item[1]))
+    features = features[features["split"].isin(UNIFIED_SPLITS)].dropna(
+        subset=["unified_sql_pattern"]
+    )
+    unified_patterns = features["unified_sql_pattern"].map(displays)
+    if populations is None:
+        pattern_counts = unified_patterns.groupby(unified_patterns, sort=False).size()
+    else:
+        weights = [scales[key] for key in zip(features["dataset"], features["split"])]
+        pattern_counts = (
+            DataFrame({"pattern": unified_patterns, "weight": weights})
+            .groupby("pattern", sort=False)["weight"]
+            .sum()
+            .round()
+        )
+    pattern_counts = pattern_counts.sort_values(ascending=False, kind="stable")
 
     json.dump(
-        unified_stats,
+        {pattern: int(count) for pattern, count in pattern_counts.items()},
         open(f"{STATS_OUTPUT_DIR}/unified_sql_patterns.json", "w"),
         indent=4,
     )
 
 
+def assign_pattern_ids(features, displays):
+    """Adds the dense integer id of every query's unified SQL pattern to the feature table
+    (-1 if it has none), and returns the display string of every id.
+
+    Ids are assigned in order of first occurrence, one per fingerprint, which is also
+    one per display string since patterns rendered the same share their fingerprint.
+    """
+    pattern_ids, fingerprints = factorize(features["unified_sql_pattern"])
+    features["pattern_id"] = pattern_ids.astype(numpy.int32)
+    return [displays[fingerprint] for fingerprint in fingerprints]
+
+
+def pattern_coverage_matrices(group_ids, pattern_ids, groups, num_patterns):
+    """Returns the coverage and novelty matrices of groups of queries (splits or datasets).
+
+    `coverage[i, j]` is the share of the queries of group j whose pattern also
+    occurs in group i, and `novelty[i, j]` the share of the distinct patterns of
+    group j that do not occur in group i. Both come from products of the
+    group x pattern count and membership matrices.
+    """
+    counts = numpy.zeros((groups, num_patterns), dtype=numpy.int64)
+    numpy.add.at(counts, (group_ids, pattern_ids), 1)
+    members = (counts > 0).astype(numpy.int64)
+
+    queries = counts.sum(axis=1)
+    distinct = members.sum(axis=1)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        coverage = (members @ counts.T) / queries
+        novelty = 1 - (members @ members.T) / distinct
+    return numpy.nan_to_num(coverage), numpy.nan_to_num(novelty)
+
+
+def collect_pattern_coverage(features):
+    """Writes the pattern ids of every split, and the split x split and dataset x dataset
+    coverage and novelty matrices of the unified SQL patterns.
+    """
+    features = features[features["pattern_id"] >= 0]
+    pattern_ids = features["pattern_id"].to_numpy()
+    num_patterns = int(pattern_ids.max()) + 1 if len(pattern_ids) else 0
+
+    split_ids, splits = factorize(features["dataset"] + "/" + features["split"])
+    numpy.savez_compressed(
+        PATTERN_IDS_FILE,
+        **{
+            split: numpy.unique(pattern_ids[split_ids == i]).astype(numpy.int32)
+            for i, split in enumerate(splits)
+        },
+    )
+
+    dataset_ids, datasets = factorize(features["dataset"])
+    for name, group_ids, groups in [
+        ("split", split_ids, splits),
+        ("dataset", dataset_ids, datasets),
+    ]:
+        coverage, novelty = pattern_coverage_matrices(
+            group_ids, pattern_ids, len(groups), num_patterns
+        )
+        for kind, matrix in [("coverage", coverage), ("novelty", novelty)]:
+            DataFrame(matrix, index=groups, columns=groups).round(4).to_csv(
+                f"{STATS_OUTPUT_DIR}/{name}_pattern_{kind}.csv"
+            )
+
+
+def collect_pattern_sketches(features, displays, top_k=10):
+    """Writes mergeable sketches of the unified SQL patterns of every split and dataset,
+    and of the unified splits, along with their distinct counts and top `top_k` patterns.
+
+    Every sketch counts rendered patterns, so that the top patterns are readable
+    and sketches of runs over different datasets or machines can be combined
+    with `merge_sketches.py`.
+    """
+    sketches = PatternSketches()
+    patterns = features.dropna(subset=["unified_sql_pattern"]).assign(
+        pattern=lambda frame: frame["unified_sql_pattern"].map(displays)
+    )
+    counts = patterns.groupby(["dataset", "split", "pattern"], sort=False).size()
+    for (dataset, split), split_counts in counts.groupby(level=["dataset", "split"], sort=False):
+        sketch = PatternSketch()
+        sketch.add_counts(dict(zip(split_counts.index.get_level_values("pattern"), split_counts)))
+        sketches.splits[f"{dataset}/{split}"] = sketch
+        sketches.datasets.setdefault(dataset, PatternSketch()).merge(sketch)
+
+    unified_patterns = patterns[patterns["split"].isin(UNIFIED_SPLITS)]["pattern"]
+    sketches.unified.add_counts(unified_patterns.value_counts(sort=False).to_dict())
+
+    json.dump(sketches.to_dict(), open(SKETCHES_FILE, "w"))
+    json.dump(sketches.summary(top_k), open(SKETCH_SUMMARY_FILE, "w"), indent=4)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of processes parsing and normalizing queries",
+        default=1,
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        help="number of jsonl lines per work unit",
+        default=CHUNK_SIZE,
+    )
+    parser.add_argument(
+        "--features_file",
+        type=str,
+        help="per-query feature table, as Parquet or as an Arrow IPC file for .arrow/.feather "
+        "(requires pyarrow, skipped without it; an empty path skips it)",
+        default=FEATURES_FILE,
+    )
+    parser.add_argument(
+        "--sample_size",
+        type=int,
+        help="estimate the statistics from a uniform sample of this many queries per split, "
+        "with confidence intervals (by default every query is used)",
+        default=None,
+    )
+    parser.add_argument(
+        "--seed", type=int, help="random seed of the per-split samples", default=0
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        help="confidence level of the intervals of the sampled statistics",
+        default=CONFIDENCE,
+    )
+    return parser
+
+
 if __name__ == "__main__":
+    parser = get_parser()
+    args = parser.parse_args()
+    if args.features_file:
+        try:
+            import pyarrow
+        except ImportError:
+            print(
+                f"Warning: not writing {args.features_file}, the feature table requires pyarrow "
+                "(poetry install -E arrow)"
+            )
+            args.features_file = None
+
     start = time()
-    collect_dataset_level_statistics()
-    collect_unified_statisitcs()
+    features, errors, displays, populations = collect_query_features(
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        sample_size=args.sample_size,
+        seed=args.seed,
+    )
+    vocabulary = assign_pattern_ids(features, displays)
+    json.dump(vocabulary, open(PATTERN_VOCABULARY_FILE, "w"), indent=4)
+    if args.features_file:
+        write_features(features, args.features_file)
+    collect_dataset_level_statistics(features, errors, populations, args.confidence)
+    collect_unified_statisitcs(features, displays, populations)
+    collect_pattern_coverage(features)
+    # Sketches are merged across shards as counts, which samples would distort.
+    if populations is None:
+        collect_pattern_sketches(features, displays)
+    parse_cache.close()
+    print(f"sqlglot parses: {parse_cache.parses}")
     print(f"Took {strftime('%Mm%Ss', gmtime(time() - start))}")
@@ -0,0 +1,175 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+from tqdm import tqdm
+from collections import Counter
+from pandas import DataFrame
+from parse_cache import ParseCache
+from near_duplicates import MinHashLSH
+from unified_text2sql_benchmark.compressed_jsonl import iter_lines
+from unified_text2sql_benchmark.dataset import split_files
+
+STATS_OUTPUT_DIR = "stats/output"
+STATS_CACHE_DIR = "stats/cache"
+UNIFIED_DIR = "unified"
+
+TRAIN_JSONL_FILE = "train.jsonl"
+
+# Questions are short, so fewer permutations are enough to tell them apart.
+NUM_PERM = 64
+THRESHOLD = 0.8
+
+WHITESPACE_REGEX = re.compile(r"\s+")
+PUNCTUATION_REGEX = re.compile(r"[^\w\s]")
+
+OVERLAPS = ["sql", "question", "fuzzy_question"]
+
+
+def text_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def normalize_question(question):
+    question = PUNCTUATION_REGEX.sub(" ", question.lower())
+    return WHITESPACE_REGEX.sub(" ", question).strip()
+
+
+def normalize_query(query, parse_cache):
+    """Returns the query as regenerated by sqlglot, lowercased with collapsed whitespace.
+
+    Queries sqlglot cannot parse are only lowercased and their whitespace collapsed.
+    """
+    parsed_query, error = parse_cache.parse(query)
+    if parsed_query is not None and error is None:
+        query = parsed_query.sql()
+    return WHITESPACE_REGEX.sub(" ", query.lower()).strip()
+
+
+def iter_splits():
+    """Yields (split name, jsonl path) of every unified split, e.g. ("spider/dev", ...).
+
+    Compressed splits (`.jsonl.zst`) are read when their `.jsonl` is missing.
+    """
+    for dataset in sorted(os.listdir(UNIFIED_DIR)):
+        for split, path in split_files(f"{UNIFIED_DIR}/{dataset}").items():
+            yield f"{dataset}/{split}", path
+
+
+def iter_examples(path, parse_cache):
+    """Yields the (db_id, normalized SQL) and normalized question of every example."""
+    for line in iter_lines(path):
+        example = json.loads(line)
+        sql_key = text_hash(
+            example.get("db_id", "") + "\t" + normalize_query(example["query"], parse_cache)
+        )
+        yield sql_key, normalize_question(example.get("question", ""))
+
+
+class LeakageIndex:
+    """Hashed indexes of the training examples of every dataset.
+
+    Exact matches are looked up by hash of (db_id, normalized SQL) and of the
+    normalized question, and fuzzy question matches through a MinHash/LSH index
+    of question word n-grams, so every evaluation example is matched against all
+    the training splits at once.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, threshold=THRESHOLD):
+        self.train_splits = []
+        self.sql_index = {}
+        self.question_index = {}
+        self.fuzzy_questions = MinHashLSH(num_perm=num_perm, threshold=threshold)
+
+    def add_train_split(self, split, path, parse_cache):
+        self.train_splits.append(split)
+        for sql_key, question in iter_examples(path, parse_cache):
+            self.sql_index.setdefault(sql_key, set()).add(split)
+            if question:
+                self.question_index.setdefault(text_hash(question), set()).add(split)
+                self.fuzzy_questions.add(text_hash(question), question, split)
+
+    def match(self, sql_key, question):
+        """Returns the training splits matching an example, per kind of overlap."""
+        matches = {
+            "sql": self.sql_index.get(sql_key, set()),
+            "question": set(),
+            "fuzzy_question": set(),
+        }
+        if question:
+            matches["question"] = self.question_index.get(text_hash(question), set())
+            for question_id, _ in self.fuzzy_questions.query_ids(question):
+                matches["fuzzy_question"].update(self.fuzzy_questions.datasets[question_id])
+        return matches
+
+
+def collect_leakage_statistics(num_perm=NUM_PERM, threshold=THRESHOLD):
+    """Writes the overlap of every evaluation split with every training split.
+
+    `leakage_stats.csv` has one row per (train, eval) pair with the share of the
+    evaluation examples whose SQL (on the same db_id), question, or a near
+    duplicate question appears in the training split, and
+    `leakage_{overlap}_matrix.csv` pivots each of them into a train x eval matrix.
+    """
+    parse_cache = ParseCache(f"{STATS_CACHE_DIR}/parse_cache.sqlite")
+    index = LeakageIndex(num_perm=num_perm, threshold=threshold)
+
+    splits = list(iter_splits())
+    for split, path in tqdm(splits, desc="Indexing training splits"):
+        if path.endswith(TRAIN_JSONL_FILE):
+            index.add_train_split(split, path, parse_cache)
+    parse_cache.flush()
+
+    rows = []
+    for split, path in tqdm(splits, desc="Matching evaluation splits"):
+        if path.endswith(TRAIN_JSONL_FILE):
+            continue
+
+        nlqs = 0
+        overlaps = {overlap: Counter() for overlap in OVERLAPS}
+        for sql_key, question in iter_examples(path, parse_cache):
+            nlqs += 1
+            for overlap, train_splits in index.match(sql_key, question).items():
+                overlaps[overlap].update(train_splits)
+
+        for train_split in index.train_splits:
+            row = {"train": train_split, "eval": split, "eval_nlqs": nlqs}
+            for overlap in OVERLAPS:
+                count = overlaps[overlap][train_split]
+                row[f"{overlap}_overlap"] = count
+                row[f"{overlap}_overlap_ratio"] = round(count / (nlqs or 1), 4)
+            rows.append(row)
+    parse_cache.close()
+
+    columns = ["train", "eval", "eval_nlqs"]
+    for overlap in OVERLAPS:
+        columns.extend([f"{overlap}_overlap", f"{overlap}_overlap_ratio"])
+    leakage_df = DataFrame(rows, columns=columns)
+    leakage_df.to_csv(f"{STATS_OUTPUT_DIR}/leakage_stats.csv", index=False)
+
+    for overlap in OVERLAPS:
+        matrix = leakage_df.pivot(index="train", columns="eval", values=f"{overlap}_overlap_ratio")
+        matrix.to_csv(f"{STATS_OUTPUT_DIR}/leakage_{overlap}_matrix.csv")
+
+    return leakage_df
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        help="estimated Jaccard similarity above which questions are near duplicates",
+        default=THRESHOLD,
+    )
+    parser.add_argument(
+        "--num_perm", type=int, help="number of MinHash permutations", default=NUM_PERM
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    os.makedirs(STATS_OUTPUT_DIR, exist_ok=True)
+    collect_leakage_statistics(num_perm=args.num_perm, threshold=args.threshold)
@@ -0,0 +1,43 @@
+import json
+import argparse
+from sketches import PatternSketches
+
+STATS_OUTPUT_DIR = "stats/output"
+
+
+def merge_sketch_files(paths):
+    """Returns the merged `PatternSketches` written by `generate_statistics.py` runs."""
+    merged = PatternSketches()
+    for path in paths:
+        with open(path) as reader:
+            merged.merge(PatternSketches.from_dict(json.load(reader)))
+    return merged
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "sketch_files", nargs="+", help="sql_pattern_sketches.json files of the shards to merge"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="merged sketches file",
+        default=f"{STATS_OUTPUT_DIR}/merged_sql_pattern_sketches.json",
+    )
+    parser.add_argument(
+        "--summary",
+        type=str,
+        help="distinct pattern counts and top patterns of the merged sketches",
+        default=f"{STATS_OUTPUT_DIR}/merged_sql_pattern_sketch_summary.json",
+    )
+    parser.add_argument("--top_k", type=int, help="number of top patterns", default=10)
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    merged = merge_sketch_files(args.sketch_files)
+    json.dump(merged.to_dict(), open(args.output, "w"))
+    json.dump(merged.summary(args.top_k), open(args.summary, "w"), indent=4)
+    print(f"unified SQL patterns: {merged.unified.summary(0)['unique_sql_patterns']}")
@@ -0,0 +1,311 @@
+import os
+import re
+import json
+import pickle
+import hashlib
+import argparse
+import numpy
+from tqdm import tqdm
+from collections import Counter
+from parse_cache import ParseCache
+from sql_patterns import sql_fingerprint, render_pattern
+from unified_text2sql_benchmark.compressed_jsonl import iter_lines
+from unified_text2sql_benchmark.dataset import split_files
+
+STATS_OUTPUT_DIR = "stats/output"
+STATS_CACHE_DIR = "stats/cache"
+UNIFIED_DIR = "unified"
+
+INDEX_FILE = f"{STATS_CACHE_DIR}/near_duplicates_index.pkl"
+
+NUM_PERM = 128
+THRESHOLD = 0.8
+
+# Number of consecutive SQL tokens per shingle.
+SHINGLE_SIZE = 3
+
+MERSENNE_PRIME = numpy.uint64((1 << 61) - 1)
+MAX_HASH = numpy.uint64((1 << 32) - 1)
+
+# Version of the pickled index, bumped when its signatures, band keys or
+# pattern fingerprints change (2: uint32 signatures, 3: column = column
+# equalities fingerprinted as column = literal) so that stale indexes are
+# rebuilt instead of extended.
+INDEX_VERSION = 3
+
+TOKEN_REGEX = re.compile(r"\w+|[^\w\s]")
+
+
+def shingles(pattern, size=SHINGLE_SIZE):
+    tokens = TOKEN_REGEX.findall(pattern)
+    if len(tokens) <= size:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def optimal_bands(num_perm, threshold):
+    """Returns the number of LSH bands whose S-curve threshold is the highest below `threshold`.
+
+    Candidates are checked against their estimated similarity, so erring on the
+    side of more candidates only costs comparisons, not missed near duplicates.
+    """
+    divisors = [bands for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    below = [bands for bands in divisors if (1 / bands) ** (bands / num_perm) <= threshold]
+    return min(below or divisors[-1:])
+
+
+class MinHashLSH:
+    """MinHash signatures of SQL patterns, bucketed by LSH bands.
+
+    Identical patterns share one entry, so the index grows with the number of
+    distinct patterns, and candidates are only ever compared within a bucket.
+    Files are added one at a time, and the index can be pickled to add new
+    datasets later.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, threshold=THRESHOLD, seed=1):
+        self.version = INDEX_VERSION
+        self.num_perm = num_perm
+        self.threshold = threshold
+        self.num_bands = optimal_bands(num_perm, threshold)
+        self.rows = num_perm // self.num_bands
+
+        generator = numpy.random.RandomState(seed)
+        self.a = generator.randint(1, MERSENNE_PRIME, size=num_perm, dtype=numpy.uint64)
+        self.b = generator.randint(0, MERSENNE_PRIME, size=num_perm, dtype=numpy.uint64)
+
+        self.ids = {}
+        self.patterns = []
+        self.signatures = []
+        self.counts = Counter()
+        self.datasets = []
+        self.buckets = [{} for _ in range(self.num_bands)]
+        self.files = {}
+
+    def minhash(self, pattern):
+        hashes = numpy.array(
+            [
+                int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+                for s in shingles(pattern)
+            ],
+            dtype=numpy.uint64,
+        )
+        permuted = (numpy.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0).astype(numpy.uint32)
+
+    def band_keys(self, signature):
+        for band in range(self.num_bands):
+            yield band, signature[band * self.rows : (band + 1) * self.rows].tobytes()
+
+    def add(self, fingerprint, pattern, dataset, count=1):
+        """Adds `count` queries of a pattern, returning its id in the index."""
+        pattern_id = self.ids.get(fingerprint)
+        if pattern_id is None:
+            pattern_id = len(self.patterns)
+            self.ids[fingerprint] = pattern_id
+            self.patterns.append(pattern)
+            self.datasets.append(set())
+            signature = self.minhash(pattern)
+            self.signatures.append(signature)
+            for band, key in self.band_keys(signature):
+                self.buckets[band].setdefault(key, []).append(pattern_id)
+
+        self.counts[pattern_id] += count
+        self.datasets[pattern_id].add(dataset)
+        return pattern_id
+
+    def similarity(self, first_id, second_id):
+        """Estimated Jaccard similarity of the shingles of two patterns."""
+        return float(numpy.mean(self.signatures[first_id] == self.signatures[second_id]))
+
+    def query_ids(self, pattern, threshold=None):
+        """Returns (id, similarity) pairs of indexed patterns near `pattern`.
+
+        Only patterns sharing a band with `pattern` are candidates, so thresholds
+        well below the one the index was built with may miss matches.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        signature = self.minhash(pattern)
+        candidates = set()
+        for band, key in self.band_keys(signature):
+            candidates.update(self.buckets[band].get(key, []))
+
+        matches = []
+        for pattern_id in candidates:
+            similarity = float(numpy.mean(signature == self.signatures[pattern_id]))
+            if similarity >= threshold:
+                matches.append((pattern_id, similarity))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def query(self, pattern, threshold=None):
+        """Returns (pattern, similarity) pairs of indexed patterns near `pattern`."""
+        return [
+            (self.patterns[pattern_id], similarity)
+            for pattern_id, similarity in self.query_ids(pattern, threshold)
+        ]
+
+    def clusters(self, threshold=None):
+        """Groups the patterns into clusters of near duplicates.
+
+        Every pattern sharing a bucket with another one is compared to the
+        bucket's first pattern only, and matches are merged with union-find, so
+        clustering is linear in the number of indexed patterns.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        parents = list(range(len(self.patterns)))
+
+        def find(pattern_id):
+            while parents[pattern_id] != pattern_id:
+                parents[pattern_id] = parents[parents[pattern_id]]
+                pattern_id = parents[pattern_id]
+            return pattern_id
+
+        for buckets in self.buckets:
+            for members in buckets.values():
+                head = members[0]
+                for pattern_id in members[1:]:
+                    if self.similarity(head, pattern_id) >= threshold:
+                        parents[find(pattern_id)] = find(head)
+
+        clusters = {}
+        for pattern_id in range(len(self.patterns)):
+            clusters.setdefault(find(pattern_id), []).append(pattern_id)
+        return list(clusters.values())
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "wb") as writer:
+            pickle.dump(self, writer, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.tmp", path)
+
+    @staticmethod
+    def load(path):
+        """Returns the pickled index, or None if built by another version."""
+        with open(path, "rb") as reader:
+            index = pickle.load(reader)
+        if getattr(index, "version", 1) != INDEX_VERSION:
+            return None
+        return index
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def add_jsonl_file(index, path, dataset, parse_cache):
+    """Adds the queries of a jsonl file to the index, unless it was added before."""
+    if path in index.files:
+        if index.files[path] != file_fingerprint(path):
+            print(f"{path} changed since it was indexed, use --rebuild to index it again")
+        return False
+
+    displays = {}
+    for line in iter_lines(path):
+        query = json.loads(line)["query"]
+        parsed_query, error = parse_cache.parse(query)
+        if parsed_query is None:
+            continue
+
+        try:
+            fingerprint = sql_fingerprint(parsed_query, join_aware=True)
+            if fingerprint not in index.ids and fingerprint not in displays:
+                displays[fingerprint] = render_pattern(parsed_query, join_aware=True)
+        except Exception as e:
+            print(f"Exception transforming: {parsed_query}: {e}")
+            continue
+        index.add(fingerprint, displays.get(fingerprint), dataset)
+
+    index.files[path] = file_fingerprint(path)
+    return True
+
+
+def build_index(index, parse_cache):
+    paths = [
+        (dataset, path)
+        for dataset in sorted(os.listdir(UNIFIED_DIR))
+        for path in split_files(f"{UNIFIED_DIR}/{dataset}").values()
+    ]
+    for dataset, path in tqdm(paths, desc="Indexing"):
+        add_jsonl_file(index, path, dataset, parse_cache)
+        parse_cache.flush()
+    return index
+
+
+def write_clusters(index, threshold=None):
+    clusters = []
+    for cluster in index.clusters(threshold):
+        # Distinct fingerprints may be rendered the same, so counts are summed
+        # by rendered pattern.
+        patterns = Counter()
+        for pattern_id in cluster:
+            patterns[index.patterns[pattern_id]] += index.counts[pattern_id]
+        clusters.append(
+            {
+                "nlqs": sum(index.counts[pattern_id] for pattern_id in cluster),
+                "datasets": sorted(set().union(*(index.datasets[i] for i in cluster))),
+                "patterns": dict(patterns.most_common()),
+            }
+        )
+    clusters.sort(key=lambda cluster: -cluster["nlqs"])
+
+    json.dump(
+        clusters,
+        open(f"{STATS_OUTPUT_DIR}/near_duplicate_sql_patterns.json", "w"),
+        indent=4,
+    )
+    return clusters
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        help="estimated Jaccard similarity above which patterns are near duplicates",
+        default=THRESHOLD,
+    )
+    parser.add_argument(
+        "--num_perm", type=int, help="number of MinHash permutations", default=NUM_PERM
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="rebuild the index instead of adding new files to the existing one",
+    )
+    parser.add_argument(
+        "--query", type=str, help="print the indexed patterns near this SQL query", default=None
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    os.makedirs(STATS_OUTPUT_DIR, exist_ok=True)
+    parse_cache = ParseCache(f"{STATS_CACHE_DIR}/parse_cache.sqlite")
+
+    index = None
+    if os.path.exists(INDEX_FILE) and not args.rebuild:
+        index = MinHashLSH.load(INDEX_FILE)
+        if index is None:
+            print(f"{INDEX_FILE} was built by an older version, rebuilding it")
+        elif index.num_perm != args.num_perm:
+            print(f"Using the {index.num_perm} permutations of the existing index")
+    if index is None:
+        index = MinHashLSH(num_perm=args.num_perm, threshold=args.threshold)
+
+    build_index(index, parse_cache)
+    index.save(INDEX_FILE)
+
+    if args.query:
+        parsed_query, error = parse_cache.parse(args.query)
+        if parsed_query is None:
+            raise ValueError(f"Could not parse {args.query}: {error}")
+        for pattern, similarity in index.query(
+            render_pattern(parsed_query, join_aware=True), args.threshold
+        ):
+            print(f"{similarity:.2f}\t{pattern}")
+    else:
+        clusters = write_clusters(index, args.threshold)
+        print(f"{len(index.patterns)} patterns in {len(clusters)} clusters")
+    parse_cache.close()
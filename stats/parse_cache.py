@@ -0,0 +1,140 @@
+import os
+import zlib
+import pickle
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+import sqlglot
+from sqlglot import parse
+
+# Number of parses kept in memory, so that consecutive passes over the same file
+# do not go back to disk.
+MEMORY_CACHE_SIZE = 20000
+
+# Number of new parses buffered before they are written to disk.
+FLUSH_EVERY = 1000
+
+
+def sql_hash(query):
+    return hashlib.blake2b(query.encode("utf-8"), digest_size=16).digest()
+
+
+def parse_query(query):
+    """Parses a query once, with the outcome of both `transpile` and `parse_one`.
+
+    Returns a tuple of the first parsed statement (what `parse_one` returns, or
+    None if it fails) and the error message `transpile` would raise (or None).
+    """
+    try:
+        expressions = parse(query)
+    except Exception as e:
+        return None, str(e)
+
+    parsed_query = expressions[0] if expressions else None
+    try:
+        for expression in expressions:
+            expression.sql()
+    except Exception as e:
+        return parsed_query, str(e)
+
+    if parsed_query is None:
+        return None, f"No expression was parsed from '{query}'"
+    return parsed_query, None
+
+
+def dump_ast(parsed_query):
+    if parsed_query is None:
+        return None
+    return zlib.compress(pickle.dumps(parsed_query, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def load_ast(blob):
+    if blob is None:
+        return None
+    return pickle.loads(zlib.decompress(blob))
+
+
+class ParseCache:
+    """On-disk cache of sqlglot parses keyed by a hash of the SQL text.
+
+    Parsed queries are stored as compressed pickled ASTs in an SQLite file, and
+    parse failures are stored too, so every distinct query is parsed at most once
+    across passes and runs. The cache is invalidated when the sqlglot version
+    changes. Returned ASTs are shared and must not be modified in place.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parses = 0
+        self._conn = None
+        self._pid = None
+        self._memory = OrderedDict()
+        self._pending = []
+
+    @property
+    def conn(self):
+        # Connections must not be shared with forked worker processes.
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._pid = os.getpid()
+            self._pending = []
+            # Lets worker processes read while another one writes.
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS parses "
+                "(sql_hash BLOB PRIMARY KEY, ast BLOB, error TEXT)"
+            )
+            version = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'sqlglot_version'"
+            ).fetchone()
+            if version is None or version[0] != sqlglot.__version__:
+                self._conn.execute("DELETE FROM parses")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('sqlglot_version', ?)",
+                    (sqlglot.__version__,),
+                )
+            self._conn.commit()
+        return self._conn
+
+    def parse(self, query):
+        """Returns the (parsed query, transpile error) pair of `parse_query`."""
+        key = sql_hash(query)
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+        row = self.conn.execute(
+            "SELECT ast, error FROM parses WHERE sql_hash = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            result = load_ast(row[0]), row[1]
+        else:
+            result = parse_query(query)
+            self.parses += 1
+            self._pending.append((key, dump_ast(result[0]), result[1]))
+            if len(self._pending) >= FLUSH_EVERY:
+                self.flush()
+
+        self._memory[key] = result
+        if len(self._memory) > MEMORY_CACHE_SIZE:
+            self._memory.popitem(last=False)
+        return result
+
+    def flush(self):
+        if self._pending:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO parses VALUES (?, ?, ?)", self._pending
+            )
+            self.conn.commit()
+            self._pending = []
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,145 @@
+from sqlglot import exp
+from sql_patterns import PLACEHOLDER_AGG_TYPES
+
+# Features counting the nodes of (a subclass of) a given type.
+COUNTED_TYPES = {
+    "joins": exp.Join,
+    "selects": exp.Select,
+    "intersects": exp.Intersect,
+    "excepts": exp.Except,
+    "group_bys": exp.Group,
+    "order_bys": exp.Order,
+    "havings": exp.Having,
+    "limits": exp.Limit,
+    "distincts": exp.Distinct,
+    "ors": exp.Or,
+    "ands": exp.And,
+    "likes": exp.Like,
+    "columns": exp.Column,
+    "tables": exp.Table,
+    "literals": exp.Literal,
+}
+
+FEATURE_COLUMNS = [
+    *COUNTED_TYPES,
+    "unions",
+    "aggregates",
+    "nest_level",
+    "subquery_depth",
+    "hardness",
+]
+
+HARDNESS_LEVELS = ["easy", "medium", "hard", "extra"]
+
+_features_by_type = {}
+
+
+def features_of_type(node_type):
+    features = _features_by_type.get(node_type)
+    if features is None:
+        features = [
+            feature
+            for feature, counted_type in COUNTED_TYPES.items()
+            if issubclass(node_type, counted_type)
+        ]
+        # Unlike the other set operations, EXCEPT and INTERSECT subclass UNION.
+        if node_type is exp.Union:
+            features.append("unions")
+        if node_type in PLACEHOLDER_AGG_TYPES:
+            features.append("aggregates")
+        _features_by_type[node_type] = features
+    return features
+
+
+def main_select(parsed_query):
+    """Returns the SELECT a query starts with, going down set operations and subqueries."""
+    while isinstance(parsed_query, (exp.Union, exp.Subquery)):
+        parsed_query = parsed_query.this
+    return parsed_query
+
+
+def hardness(components, nested, others):
+    """Spider's hardness level, from its `count_component1`, `count_component2` and
+    `count_others` counts.
+    """
+    if components <= 1 and others == 0 and nested == 0:
+        return "easy"
+    elif (others <= 2 and components <= 1 and nested == 0) or (
+        components <= 2 and others < 2 and nested == 0
+    ):
+        return "medium"
+    elif (
+        (others > 2 and components <= 2 and nested == 0)
+        or (2 < components <= 3 and others <= 2 and nested == 0)
+        or (components <= 1 and others == 0 and nested <= 1)
+    ):
+        return "hard"
+    return "extra"
+
+
+def query_features(parsed_query):
+    """Returns the features of a parsed query, computed in a single walk of its tree.
+
+    Besides node counts, `nest_level` is the number of SELECTs not coming from
+    INTERSECT or EXCEPT, `subquery_depth` the deepest nesting of SELECTs, and
+    `hardness` approximates Spider's hardness level on the sqlglot tree.
+    """
+    features = dict.fromkeys(FEATURE_COLUMNS, 0)
+    main = main_select(parsed_query)
+
+    main_aggregates = 0
+    main_where_ors = 0
+    main_where_ands = 0
+    main_where_likes = 0
+
+    # (node, SELECT depth, under the main SELECT, under its WHERE)
+    stack = [(parsed_query, 0, False, False)]
+    while stack:
+        node, depth, in_main, in_main_where = stack.pop()
+        node_type = type(node)
+        for feature in features_of_type(node_type):
+            features[feature] += 1
+
+        if node_type is exp.Select:
+            depth += 1
+            features["subquery_depth"] = max(features["subquery_depth"], depth)
+            in_main = node is main
+            in_main_where = False
+        elif in_main:
+            if node_type in PLACEHOLDER_AGG_TYPES:
+                main_aggregates += 1
+            if in_main_where:
+                main_where_ors += node_type is exp.Or
+                main_where_ands += node_type is exp.And
+                main_where_likes += isinstance(node, exp.Like)
+
+        for key, value in node.args.items():
+            child_in_main_where = in_main_where or (node is main and key == "where")
+            if isinstance(value, exp.Expression):
+                stack.append((value, depth, in_main, child_in_main_where))
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, exp.Expression):
+                        stack.append((item, depth, in_main, child_in_main_where))
+
+    features["nest_level"] = features["selects"] - (features["intersects"] + features["excepts"])
+
+    if isinstance(main, exp.Select):
+        args = main.args
+        components = sum(1 for key in ["where", "group", "order", "limit"] if args.get(key))
+        components += len(args.get("joins") or []) + main_where_ors + main_where_likes
+
+        group_by_columns = len(args["group"].expressions) if args.get("group") else 0
+        others = sum(
+            [
+                main_aggregates > 1,
+                len(main.expressions) > 1,
+                main_where_ors + main_where_ands > 0,
+                group_by_columns > 1,
+            ]
+        )
+        features["hardness"] = hardness(components, features["selects"] - 1, others)
+    else:
+        features["hardness"] = None
+
+    return features
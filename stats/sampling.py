@@ -0,0 +1,65 @@
+import math
+import numpy
+from statistics import NormalDist
+
+
+def reservoir_sample(items, size, rng):
+    """Returns the number of items and a uniform sample of `size` of them.
+
+    The sample is a list of (index, item) pairs in the order of the items, and is
+    collected in one pass holding at most `size` items (Algorithm R).
+    """
+    reservoir = []
+    population = 0
+    for index, item in enumerate(items):
+        population += 1
+        if index < size:
+            reservoir.append((index, item))
+        else:
+            slot = rng.randrange(index + 1)
+            if slot < size:
+                reservoir[slot] = (index, item)
+    return population, sorted(reservoir, key=lambda entry: entry[0])
+
+
+def z_score(confidence):
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def mean_interval(values, population, z):
+    """Returns the mean of a sample of a population and its confidence interval.
+
+    The interval is the normal approximation, with the finite population
+    correction, so it shrinks to the mean when the whole population is sampled.
+    """
+    sample = len(values)
+    if sample == 0:
+        return 0.0, 0.0, 0.0
+
+    mean = float(numpy.mean(values))
+    if sample == 1 or population <= 1:
+        return mean, mean, mean
+
+    correction = math.sqrt(max(population - sample, 0) / (population - 1))
+    half_width = z * float(numpy.std(values, ddof=1)) / math.sqrt(sample) * correction
+    return mean, mean - half_width, mean + half_width
+
+
+def gee_cardinality(counts, scale):
+    """Estimates the number of distinct values of a population from a sample.
+
+    `counts` are the number of occurrences of every distinct value of the sample,
+    and `scale` the population size over the sample size. Returns the Guaranteed
+    Error Estimator (Charikar et al., 2000), which scales the values seen once by
+    the square root of `scale`, along with its lower and upper bounds: the values
+    seen, and every value seen once standing for `scale` distinct values.
+    """
+    counts = numpy.asarray(counts)
+    distinct = len(counts)
+    singletons = int(numpy.sum(counts == 1))
+    others = distinct - singletons
+    return (
+        math.sqrt(scale) * singletons + others,
+        distinct,
+        scale * singletons + others,
+    )
@@ -0,0 +1,224 @@
+import zlib
+import base64
+import hashlib
+import numpy
+
+# 2^14 registers, a standard error of about 0.8% in 16KB.
+HLL_PRECISION = 14
+
+# Number of counters of the heavy hitters sketches.
+HEAVY_HITTERS_CAPACITY = 1000
+
+
+def hash64(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def bit_length(values):
+    """Vectorized `int.bit_length` of an array of uint64."""
+    lengths = numpy.zeros(len(values), dtype=numpy.uint8)
+    values = values.copy()
+    for shift in [32, 16, 8, 4, 2, 1]:
+        shift = numpy.uint64(shift)
+        mask = values >= (numpy.uint64(1) << shift)
+        lengths[mask] += numpy.uint8(shift)
+        values[mask] >>= shift
+    return lengths + (values > 0).astype(numpy.uint8)
+
+
+class HyperLogLog:
+    """HyperLogLog sketch of the number of distinct keys.
+
+    Sketches of the same precision are merged by taking the maximum of their
+    registers, so distinct counts of shards can be combined without their keys.
+    """
+
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        if registers is None:
+            registers = numpy.zeros(1 << precision, dtype=numpy.uint8)
+        self.registers = registers
+
+    def add_hashes(self, hashes):
+        hashes = numpy.asarray(hashes, dtype=numpy.uint64)
+        if not len(hashes):
+            return
+        suffix_bits = 64 - self.precision
+        indices = (hashes >> numpy.uint64(suffix_bits)).astype(numpy.int64)
+        suffixes = hashes & numpy.uint64((1 << suffix_bits) - 1)
+        ranks = (suffix_bits + 1 - bit_length(suffixes)).astype(numpy.uint8)
+        numpy.maximum.at(self.registers, indices, ranks)
+
+    def add(self, keys):
+        self.add_hashes([hash64(key) for key in keys])
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(
+                f"Cannot merge HyperLogLog sketches of precisions {self.precision} and "
+                f"{other.precision}"
+            )
+        numpy.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / numpy.sum(numpy.ldexp(1.0, -self.registers.astype(int)))
+        zeros = int(numpy.count_nonzero(self.registers == 0))
+        # Linear counting is more accurate for small cardinalities.
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * numpy.log(m / zeros)
+        return float(estimate)
+
+    def to_dict(self):
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(zlib.compress(self.registers.tobytes())).decode("ascii"),
+        }
+
+    @staticmethod
+    def from_dict(d):
+        registers = numpy.frombuffer(
+            zlib.decompress(base64.b64decode(d["registers"])), dtype=numpy.uint8
+        ).copy()
+        return HyperLogLog(d["precision"], registers)
+
+
+class HeavyHitters:
+    """Misra-Gries summary of the most frequent keys.
+
+    Counts are underestimated by at most `total / (capacity + 1)`, so every key
+    more frequent than that is kept. Summaries are merged by adding their counters
+    and pruning them back to `capacity` (Agarwal et al., 2012).
+    """
+
+    def __init__(self, capacity=HEAVY_HITTERS_CAPACITY, counters=None, total=0):
+        self.capacity = capacity
+        self.counters = dict(counters or {})
+        self.total = total
+
+    def add(self, key, count=1):
+        self.counters[key] = self.counters.get(key, 0) + count
+        self.total += count
+        # Pruning is amortized over as many new keys as counters.
+        if len(self.counters) > 2 * self.capacity:
+            self.prune()
+
+    def prune(self):
+        if len(self.counters) > self.capacity:
+            threshold = sorted(self.counters.values(), reverse=True)[self.capacity]
+            self.counters = {
+                key: count - threshold
+                for key, count in self.counters.items()
+                if count > threshold
+            }
+
+    def merge(self, other):
+        for key, count in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + count
+        self.total += other.total
+        self.capacity = max(self.capacity, other.capacity)
+        self.prune()
+        return self
+
+    @property
+    def error(self):
+        """Upper bound of the underestimation of every count."""
+        return self.total // (self.capacity + 1)
+
+    def most_common(self, k=None):
+        self.prune()
+        counters = sorted(self.counters.items(), key=lambda item: -item[1])
+        return dict(counters[:k])
+
+    def to_dict(self):
+        self.prune()
+        return {"capacity": self.capacity, "total": self.total, "counters": self.counters}
+
+    @staticmethod
+    def from_dict(d):
+        return HeavyHitters(d["capacity"], d["counters"], d["total"])
+
+
+class PatternSketch:
+    """Distinct count and most frequent keys of a stream of SQL patterns."""
+
+    def __init__(self, hll=None, heavy_hitters=None):
+        self.hll = hll or HyperLogLog()
+        self.heavy_hitters = heavy_hitters or HeavyHitters()
+
+    def add_counts(self, counts):
+        """Adds a {pattern: number of queries} mapping."""
+        self.hll.add(counts.keys())
+        for pattern, count in counts.items():
+            self.heavy_hitters.add(pattern, int(count))
+
+    def merge(self, other):
+        self.hll.merge(other.hll)
+        self.heavy_hitters.merge(other.heavy_hitters)
+        return self
+
+    def summary(self, k=10):
+        return {
+            "nlqs": self.heavy_hitters.total,
+            "unique_sql_patterns": round(self.hll.estimate()),
+            "top_patterns": self.heavy_hitters.most_common(k),
+        }
+
+    def to_dict(self):
+        return {"hll": self.hll.to_dict(), "heavy_hitters": self.heavy_hitters.to_dict()}
+
+    @staticmethod
+    def from_dict(d):
+        return PatternSketch(
+            HyperLogLog.from_dict(d["hll"]), HeavyHitters.from_dict(d["heavy_hitters"])
+        )
+
+
+class PatternSketches:
+    """Pattern sketches of every split and dataset, and of the unified patterns.
+
+    This is what a run (or a shard of a run) writes, and what shards are merged
+    into.
+    """
+
+    def __init__(self, splits=None, datasets=None, unified=None):
+        self.splits = splits or {}
+        self.datasets = datasets or {}
+        self.unified = unified or PatternSketch()
+
+    def merge(self, other):
+        for sketches, other_sketches in [
+            (self.splits, other.splits),
+            (self.datasets, other.datasets),
+        ]:
+            for key, sketch in other_sketches.items():
+                if key in sketches:
+                    sketches[key].merge(sketch)
+                else:
+                    sketches[key] = sketch
+        self.unified.merge(other.unified)
+        return self
+
+    def summary(self, k=10):
+        return {
+            "unified": self.unified.summary(k),
+            "datasets": {key: sketch.summary(k) for key, sketch in self.datasets.items()},
+            "splits": {key: sketch.summary(k) for key, sketch in self.splits.items()},
+        }
+
+    def to_dict(self):
+        return {
+            "splits": {key: sketch.to_dict() for key, sketch in self.splits.items()},
+            "datasets": {key: sketch.to_dict() for key, sketch in self.datasets.items()},
+            "unified": self.unified.to_dict(),
+        }
+
+    @staticmethod
+    def from_dict(d):
+        return PatternSketches(
+            {key: PatternSketch.from_dict(sketch) for key, sketch in d["splits"].items()},
+            {key: PatternSketch.from_dict(sketch) for key, sketch in d["datasets"].items()},
+            PatternSketch.from_dict(d["unified"]),
+        )
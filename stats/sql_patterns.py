@@ -0,0 +1,128 @@
+import hashlib
+from sqlglot import exp
+
+# Nodes replaced by a placeholder, along with their whole subtree.
+PLACEHOLDER_AGG_TYPES = {
+    exp.Count,
+    exp.Sum,
+    exp.Min,
+    exp.Max,
+    exp.Avg,
+    exp.Quantile,
+    exp.Stddev,
+    exp.StddevPop,
+    exp.StddevSamp,
+}
+PLACEHOLDER_COMPARISON_TYPES = {exp.LT, exp.LTE, exp.GT, exp.GTE}
+
+PLACEHOLDERS = {
+    name: exp.column(name)
+    for name in [
+        "PLACEHOLDER_COLUMN",
+        "PLACEHOLDER_TABLE",
+        "PLACEHOLDER_LITERAL",
+        "PLACEHOLDER_AGG",
+        "PLACEHOLDER_COMPARISON",
+    ]
+}
+
+
+def placeholder_name(node):
+    if isinstance(node, exp.Column):
+        return "PLACEHOLDER_COLUMN"
+    elif isinstance(node, exp.Table):
+        return "PLACEHOLDER_TABLE"
+    elif isinstance(node, exp.Literal):
+        return "PLACEHOLDER_LITERAL"
+    elif type(node) in PLACEHOLDER_AGG_TYPES:
+        return "PLACEHOLDER_AGG"
+    elif type(node) in PLACEHOLDER_COMPARISON_TYPES:
+        return "PLACEHOLDER_COMPARISON"
+    return None
+
+
+def is_value_equality(node, in_join_condition):
+    """Whether a column = column equality outside of a JOIN ... ON condition.
+
+    With `join_aware` patterns, those are treated as column = literal.
+    """
+    return (
+        not in_join_condition
+        and type(node) is exp.EQ
+        and isinstance(node.this, exp.Column)
+        and isinstance(node.expression, exp.Column)
+    )
+
+
+def _walk(node, tokens, join_aware, in_join_condition):
+    placeholder = placeholder_name(node)
+    if placeholder:
+        tokens.append(placeholder)
+        return
+
+    if join_aware and is_value_equality(node, in_join_condition):
+        # The tokens of a column = literal node, for the same fingerprint.
+        tokens.extend(
+            ["eq", "this:", "PLACEHOLDER_COLUMN", "expression:", "PLACEHOLDER_LITERAL", ")"]
+        )
+        return
+
+    tokens.append(node.key)
+    for key, value in node.args.items():
+        if value is None or value is False or value == []:
+            continue
+
+        tokens.append(f"{key}:")
+        in_condition = in_join_condition or (key == "on" and isinstance(node, exp.Join))
+        if isinstance(value, exp.Expression):
+            _walk(value, tokens, join_aware, in_condition)
+        elif isinstance(value, list):
+            tokens.append("[")
+            for item in value:
+                if isinstance(item, exp.Expression):
+                    _walk(item, tokens, join_aware, in_condition)
+                else:
+                    tokens.append(repr(item))
+            tokens.append("]")
+        else:
+            tokens.append(repr(value))
+    tokens.append(")")
+
+
+def sql_fingerprint(parsed_query, join_aware=False):
+    """Returns a stable hash of the SQL pattern of a parsed query.
+
+    The syntax tree is walked once, with columns, tables, literals, aggregates and
+    comparisons standing for placeholders, so that queries with the same
+    `render_pattern` share the same fingerprint. With `join_aware`, column =
+    column equalities are treated as column = literal, unless they are part of
+    a JOIN ... ON condition.
+    """
+    tokens = []
+    _walk(parsed_query, tokens, join_aware, False)
+    return hashlib.blake2b("\x1f".join(tokens).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def in_join_condition(node):
+    while node.parent is not None:
+        if isinstance(node.parent, exp.Join) and node.arg_key == "on":
+            return True
+        node = node.parent
+    return False
+
+
+def render_pattern(parsed_query, join_aware=False):
+    """Renders the SQL pattern of a parsed query, see `sql_fingerprint`."""
+
+    def normalizer(node):
+        placeholder = placeholder_name(node)
+        if placeholder:
+            return PLACEHOLDERS[placeholder].copy()
+        if join_aware and is_value_equality(node, in_join_condition(node)):
+            return exp.EQ(
+                this=PLACEHOLDERS["PLACEHOLDER_COLUMN"].copy(),
+                expression=PLACEHOLDERS["PLACEHOLDER_LITERAL"].copy(),
+            )
+        return node
+
+    return parsed_query.transform(normalizer).sql()
@@ -0,0 +1,38 @@
+import importlib
+
+import pytest
+import sqlglot
+from pandas import DataFrame
+
+
+@pytest.fixture
+def generate_statistics(tmp_path, monkeypatch):
+    # The module lists `unified/` and opens its caches on import.
+    (tmp_path / "unified").mkdir()
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("generate_statistics")
+
+
+def test_pattern_vocabulary_has_no_duplicates(generate_statistics):
+    queries = [
+        "SELECT a FROM t WHERE b = c",
+        "SELECT a FROM t WHERE b = 1",
+        "SELECT x FROM y WHERE z = 'v'",
+        "SELECT a FROM t JOIN u ON t.b = u.c",
+        "SELECT a FROM t JOIN u ON t.b = u.c WHERE d = e",
+        "SELECT a FROM t JOIN u ON t.b = u.c WHERE d = 2",
+        "SELECT count(*) FROM t",
+    ]
+    displays = {}
+    features = DataFrame(
+        {
+            "unified_sql_pattern": [
+                generate_statistics.add_unified_pattern(sqlglot.parse_one(query), displays)
+                for query in queries
+            ]
+        }
+    )
+
+    vocabulary = generate_statistics.assign_pattern_ids(features, displays)
+    assert len(vocabulary) == len(set(vocabulary)) == 4
+    assert features["pattern_id"].tolist() == [0, 0, 0, 1, 2, 2, 3]
@@ -0,0 +1,21 @@
+import json
+
+import near_duplicates
+from near_duplicates import MinHashLSH, write_clusters
+
+
+def test_cluster_nlqs_are_the_sum_of_their_pattern_counts(tmp_path, monkeypatch):
+    monkeypatch.setattr(near_duplicates, "STATS_OUTPUT_DIR", str(tmp_path))
+    index = MinHashLSH()
+    pattern = "SELECT PLACEHOLDER_COLUMN FROM PLACEHOLDER_TABLE WHERE PLACEHOLDER_COLUMN = 1"
+    # Distinct fingerprints rendered as the same pattern.
+    index.add("first", pattern, "spider", count=54)
+    index.add("second", pattern, "sparc", count=14)
+    index.add("third", pattern.replace("= 1", "> 1"), "spider", count=3)
+
+    clusters = write_clusters(index)
+    with open(tmp_path / "near_duplicate_sql_patterns.json") as f:
+        assert json.load(f) == clusters
+    for cluster in clusters:
+        assert cluster["nlqs"] == sum(cluster["patterns"].values())
+    assert sum(cluster["nlqs"] for cluster in clusters) == 71
@@ -0,0 +1,32 @@
+import sqlglot
+from sql_patterns import render_pattern, sql_fingerprint
+
+
+def fingerprint(query, join_aware=True):
+    return sql_fingerprint(sqlglot.parse_one(query), join_aware=join_aware)
+
+
+def test_value_equality_shares_the_fingerprint_of_column_literal():
+    assert fingerprint("SELECT a FROM t WHERE b = c") == fingerprint("SELECT a FROM t WHERE b = 1")
+
+
+def test_join_condition_keeps_its_column_equality():
+    assert fingerprint("SELECT a FROM t JOIN u ON t.b = u.c") != fingerprint(
+        "SELECT a FROM t JOIN u ON t.b = 1"
+    )
+
+
+def test_same_rendered_pattern_same_fingerprint():
+    queries = [
+        "SELECT a FROM t WHERE b = c",
+        "SELECT x FROM y WHERE z = 'v'",
+        "SELECT a FROM t JOIN u ON t.b = u.c WHERE d = e",
+        "SELECT a FROM t JOIN u ON t.b = u.c WHERE d = 3",
+    ]
+    by_pattern = {}
+    for query in queries:
+        parsed = sqlglot.parse_one(query)
+        by_pattern.setdefault(render_pattern(parsed, join_aware=True), set()).add(
+            sql_fingerprint(parsed, join_aware=True)
+        )
+    assert all(len(fingerprints) == 1 for fingerprints in by_pattern.values())
@@ -0,0 +1,28 @@
+from unified_text2sql_benchmark.compressed_jsonl import CompressedJsonl
+from unified_text2sql_benchmark.dataset import Dataset, Split, UnifiedBenchmark
+from unified_text2sql_benchmark.line_index import LineIndex
+from unified_text2sql_benchmark.schema import Schema, load_schemas
+from unified_text2sql_benchmark.schema_serialization import (
+    SchemaSerializations,
+)
+from unified_text2sql_benchmark.schema_index import (
+    SchemaIndex,
+    build_schema_index,
+    write_tables_json,
+)
+from unified_text2sql_benchmark.value_index import ValueIndex
+
+__all__ = [
+    "CompressedJsonl",
+    "Dataset",
+    "LineIndex",
+    "Schema",
+    "SchemaIndex",
+    "SchemaSerializations",
+    "Split",
+    "UnifiedBenchmark",
+    "ValueIndex",
+    "build_schema_index",
+    "load_schemas",
+    "write_tables_json",
+]
@@ -0,0 +1,203 @@
+"""Columnar export of the unified examples, for memory-mapped loading.
+
+Every split is written to `{output_dir}/{dataset}/{split}.arrow` (Arrow IPC)
+or `.parquet`. Arrow files are memory-mapped by `read_arrow`, so loading them
+does not parse anything, and worker processes reading the same files share
+their pages.
+
+Usage example:
+  python3 -m unified_text2sql_benchmark.arrow_export --output_dir unified_arrow
+
+  table = read_arrow("unified_arrow")
+  table.column("question")
+
+Requires pyarrow (`poetry install -E arrow`).
+"""
+
+import os
+import json
+import argparse
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from unified_text2sql_benchmark.dataset import UNIFIED_DIR, UnifiedBenchmark
+
+ARROW_FORMAT = "arrow"
+PARQUET_FORMAT = "parquet"
+
+# Keys of the unified examples with a column of their own, other keys are kept
+# as a JSON object in the `extra` column.
+EXAMPLE_KEYS = ["db_id", "question", "query", "history_text"]
+
+
+def require_pyarrow():
+    if pyarrow is None:
+        raise ImportError(
+            "pyarrow is required for the columnar export: "
+            "poetry install -E arrow (or pip install pyarrow)"
+        )
+
+
+def example_schema():
+    require_pyarrow()
+    dictionary = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    return pyarrow.schema(
+        [
+            ("dataset", dictionary),
+            ("split", dictionary),
+            ("index", pyarrow.int64()),
+            ("db_id", dictionary),
+            ("question", pyarrow.string()),
+            ("query", pyarrow.string()),
+            ("history_text", pyarrow.list_(pyarrow.string())),
+            ("extra", pyarrow.string()),
+        ]
+    )
+
+
+def split_table(split):
+    """Returns the examples of a split as an Arrow table.
+
+    `index` is the position of the example in the JSONL file, and
+    `history_text` is null for datasets without interactions.
+    """
+    schema = example_schema()
+    columns = {name: [] for name in schema.names}
+    for index, example in enumerate(split):
+        columns["index"].append(index)
+        for key in EXAMPLE_KEYS:
+            columns[key].append(example.get(key))
+        extra = {k: v for k, v in example.items() if k not in EXAMPLE_KEYS}
+        columns["extra"].append(json.dumps(extra) if extra else None)
+    columns["dataset"] = [split.dataset.name] * len(columns["index"])
+    columns["split"] = [split.name] * len(columns["index"])
+
+    return pyarrow.Table.from_arrays(
+        [
+            pyarrow.array(
+                columns[field.name], type=field.type.value_type
+            ).dictionary_encode()
+            if pyarrow.types.is_dictionary(field.type)
+            else pyarrow.array(columns[field.name], type=field.type)
+            for field in schema
+        ],
+        schema=schema,
+    )
+
+
+def write_table(table, path, file_format=ARROW_FORMAT):
+    with open(path + ".tmp", "wb") as f:
+        if file_format == ARROW_FORMAT:
+            with pyarrow.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            pyarrow.parquet.write_table(table, f)
+    os.replace(path + ".tmp", path)
+
+
+def export_benchmark(
+    output_dir, unified_dir=UNIFIED_DIR, datasets=None, file_format=None
+):
+    """Exports every split of the unified datasets.
+
+    Args:
+      output_dir: Folder of the exported files.
+      unified_dir: Folder of the unified datasets.
+      datasets: Names of the datasets to export, all of them by default.
+      file_format: `arrow` (default) or `parquet`.
+
+    Returns:
+      Paths of the exported files.
+    """
+    require_pyarrow()
+    file_format = file_format or ARROW_FORMAT
+    benchmark = UnifiedBenchmark(unified_dir)
+
+    paths = []
+    for name in datasets or benchmark.names:
+        dataset = benchmark[name]
+        os.makedirs(os.path.join(output_dir, name), exist_ok=True)
+        for split in dataset:
+            file_name = f"{split.name}.{file_format}"
+            path = os.path.join(output_dir, name, file_name)
+            write_table(split_table(split), path, file_format)
+            paths.append(path)
+    return paths
+
+
+def exported_files(path, file_format):
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(path)
+        for name in names
+        if name.endswith(f".{file_format}")
+    )
+
+
+def read_arrow(path):
+    """Memory-maps an exported Arrow file, or all of those of a folder.
+
+    The columns of the returned table point into the mapped files, nothing is
+    copied or parsed until values are accessed.
+    """
+    require_pyarrow()
+    tables = []
+    for file_path in exported_files(path, ARROW_FORMAT):
+        source = pyarrow.memory_map(file_path, "r")
+        tables.append(pyarrow.ipc.open_file(source).read_all())
+    if not tables:
+        return example_schema().empty_table()
+    return pyarrow.concat_tables(tables)
+
+
+def read_parquet(path):
+    """Reads an exported Parquet file, or all of those of a folder."""
+    require_pyarrow()
+    tables = [
+        pyarrow.parquet.read_table(file_path, memory_map=True)
+        for file_path in exported_files(path, PARQUET_FORMAT)
+    ]
+    if not tables:
+        return example_schema().empty_table()
+    return pyarrow.concat_tables(tables)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--unified_dir", type=str, default=UNIFIED_DIR)
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        required=True,
+        help="Folder of the exported `{dataset}/{split}` files.",
+    )
+    parser.add_argument(
+        "--datasets",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Datasets to export, all of them by default.",
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        choices=[ARROW_FORMAT, PARQUET_FORMAT],
+        default=ARROW_FORMAT,
+        help="Arrow IPC files are memory-mapped, Parquet files are smaller.",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    for path in export_benchmark(
+        args.output_dir, args.unified_dir, args.datasets, args.format
+    ):
+        print(f"Wrote {path}")
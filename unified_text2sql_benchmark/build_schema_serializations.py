@@ -0,0 +1,51 @@
+"""Precomputes the schema serializations of the unified datasets.
+
+Usage example:
+  python3 -m unified_text2sql_benchmark.build_schema_serializations
+"""
+
+import argparse
+
+from unified_text2sql_benchmark.dataset import UNIFIED_DIR, UnifiedBenchmark
+from unified_text2sql_benchmark.schema_serialization import (
+    SAMPLE_VALUES,
+    SERIALIZATIONS_FILE,
+    build_serializations,
+)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--unified_dir", type=str, default=UNIFIED_DIR)
+    parser.add_argument(
+        "--datasets",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Datasets to serialize the schemas of, all of them by default.",
+    )
+    parser.add_argument(
+        "--sample_values",
+        type=int,
+        default=SAMPLE_VALUES,
+        help="Sampled values per column, 0 to skip reading the databases.",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    benchmark = UnifiedBenchmark(args.unified_dir)
+    # Shared across datasets, so that databases copied by several datasets
+    # are only serialized once.
+    cache = {}
+    for name in args.datasets or benchmark.names:
+        serializations = build_serializations(
+            benchmark[name], args.sample_values, cache
+        )
+        num_db_ids = len(serializations.db_ids)
+        num_serializations = len(serializations.serializations)
+        print(
+            f"Wrote {name}/{SERIALIZATIONS_FILE}: {num_db_ids} databases, "
+            f"{num_serializations} serializations"
+        )
@@ -0,0 +1,44 @@
+"""Builds the cell value indexes of the unified datasets.
+
+Usage example:
+  python3 -m unified_text2sql_benchmark.build_value_indexes --datasets spider
+"""
+
+import argparse
+
+from unified_text2sql_benchmark.dataset import UNIFIED_DIR, UnifiedBenchmark
+from unified_text2sql_benchmark.value_index import build_value_index
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--unified_dir", type=str, default=UNIFIED_DIR)
+    parser.add_argument(
+        "--datasets",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Datasets to index, all of them by default.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes reading the databases.",
+    )
+    parser.add_argument(
+        "--no_trigrams",
+        action="store_true",
+        help="Skip the trigram index used for fuzzy matches.",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    benchmark = UnifiedBenchmark(args.unified_dir)
+    for name in args.datasets or benchmark.names:
+        path = build_value_index(
+            benchmark[name], not args.no_trigrams, args.workers
+        )
+        print(f"Wrote {path}")
@@ -0,0 +1,58 @@
+"""Compresses the splits of unified datasets to seekable `.jsonl.zst` files.
+
+Usage example:
+  python3 -m unified_text2sql_benchmark.compress_splits [--datasets spider]
+"""
+
+import os
+import glob
+import argparse
+
+from unified_text2sql_benchmark.compressed_jsonl import (
+    COMPRESSION_LEVEL,
+    FRAME_LINES,
+    compress_jsonl,
+)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--unified_dir", type=str, default="unified")
+    parser.add_argument(
+        "--datasets",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Datasets to compress, all of them by default.",
+    )
+    parser.add_argument("--frame_lines", type=int, default=FRAME_LINES)
+    parser.add_argument("--level", type=int, default=COMPRESSION_LEVEL)
+    parser.add_argument(
+        "--remove",
+        action="store_true",
+        help="Delete the JSONL files once compressed.",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    datasets = args.datasets or sorted(
+        name
+        for name in os.listdir(args.unified_dir)
+        if os.path.isdir(os.path.join(args.unified_dir, name))
+    )
+    for dataset in datasets:
+        for path in sorted(
+            glob.glob(os.path.join(args.unified_dir, dataset, "*.jsonl"))
+        ):
+            # Schemas are read through the byte ranges of their index.
+            if os.path.basename(path) == "tables.jsonl":
+                continue
+            compressed_path = compress_jsonl(
+                path,
+                remove=args.remove,
+                frame_lines=args.frame_lines,
+                level=args.level,
+            )
+            print(f"Wrote {compressed_path}")
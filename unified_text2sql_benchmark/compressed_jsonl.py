@@ -0,0 +1,303 @@
+"""Seekable zstd-compressed JSONL files.
+
+A `{split}.jsonl.zst` file is a sequence of independent zstd frames of a few
+lines each, so it is a regular zstd file (`zstdcat` reads it) and any frame
+can be decompressed on its own. The compressed offset and first line of every
+frame are persisted next to the file (`{path}.fidx`), so reading an example or
+a range of examples only decompresses the frames covering it.
+
+Usage example:
+  python3 -m unified_text2sql_benchmark.compress_splits [--datasets spider]
+
+Requires zstandard (`poetry install -E compression`).
+"""
+
+import os
+import sys
+import json
+from array import array
+from bisect import bisect_right
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from unified_text2sql_benchmark.line_index import file_fingerprint
+
+COMPRESSED_SUFFIX = ".zst"
+FRAME_INDEX_SUFFIX = ".fidx"
+
+# Lines per frame: larger frames compress better, smaller frames make random
+# access cheaper.
+FRAME_LINES = 1000
+COMPRESSION_LEVEL = 10
+
+# Header of the index file: file size and modification time of the indexed
+# file, and number of frames.
+HEADER_SIZE = 3
+
+# Size of the blocks read when scanning the frames of a file.
+BLOCK_SIZE = 1 << 20
+
+
+def require_zstandard():
+    if zstandard is None:
+        raise ImportError(
+            "zstandard is required for compressed JSONL: "
+            "poetry install -E compression (or pip install zstandard)"
+        )
+
+
+def decompress_frame(data):
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+class FrameIndex(object):
+    """Compressed offsets and first lines of the frames of a `.zst` file.
+
+    `offsets` and `line_starts` have one more entry than there are frames,
+    the size of the file and its number of lines.
+    """
+
+    def __init__(self, path, offsets, line_starts):
+        self.path = path
+        self.offsets = offsets
+        self.line_starts = line_starts
+
+    def __len__(self):
+        return self.line_starts[-1]
+
+    @property
+    def num_frames(self):
+        return len(self.offsets) - 1
+
+    def frame_of(self, line):
+        """Returns the frame containing a line."""
+        return bisect_right(self.line_starts, line) - 1
+
+    @staticmethod
+    def build(path):
+        """Scans a zstd file for the boundaries and line counts of frames."""
+        require_zstandard()
+        offsets = array("Q", [0])
+        line_starts = array("Q", [0])
+        with open(path, "rb") as f:
+            decompressor = zstandard.ZstdDecompressor().decompressobj()
+            consumed, lines, pending = 0, 0, b""
+            while True:
+                block = pending or f.read(BLOCK_SIZE)
+                pending = b""
+                if not block:
+                    break
+                lines += decompressor.decompress(block).count(b"\n")
+                consumed += len(block)
+                if decompressor.eof:
+                    pending = decompressor.unused_data
+                    offsets.append(offsets[-1] + consumed - len(pending))
+                    line_starts.append(line_starts[-1] + lines)
+                    decompressor = zstandard.ZstdDecompressor().decompressobj()
+                    consumed, lines = 0, 0
+        return FrameIndex(path, offsets, line_starts)
+
+    def save(self, index_path=None):
+        index_path = index_path or self.path + FRAME_INDEX_SUFFIX
+        data = array("Q", [*file_fingerprint(self.path), self.num_frames])
+        data.extend(self.offsets)
+        data.extend(self.line_starts)
+        if sys.byteorder == "big":
+            data.byteswap()
+        with open(index_path + ".tmp", "wb") as f:
+            data.tofile(f)
+        os.replace(index_path + ".tmp", index_path)
+
+    @staticmethod
+    def load(path, index_path=None):
+        """Returns the persisted index of a file, None if missing or stale."""
+        index_path = index_path or path + FRAME_INDEX_SUFFIX
+        if not os.path.exists(index_path):
+            return None
+
+        data = array("Q")
+        with open(index_path, "rb") as f:
+            data.frombytes(f.read())
+        if sys.byteorder == "big":
+            data.byteswap()
+
+        if len(data) < HEADER_SIZE:
+            return None
+        num_frames = data[2]
+        if len(data) != HEADER_SIZE + 2 * (num_frames + 1):
+            return None
+        if tuple(data[:2]) != file_fingerprint(path):
+            return None
+        boundary = HEADER_SIZE + num_frames + 1
+        return FrameIndex(path, data[HEADER_SIZE:boundary], data[boundary:])
+
+    @staticmethod
+    def open(path):
+        """Loads the index of a file, building and persisting it if needed."""
+        index = FrameIndex.load(path)
+        if index is None:
+            index = FrameIndex.build(path)
+            try:
+                index.save()
+            except OSError:
+                pass
+        return index
+
+
+def write_compressed_jsonl(
+    lines, path, frame_lines=FRAME_LINES, level=COMPRESSION_LEVEL
+):
+    """Writes JSONL lines as independent zstd frames, and indexes them.
+
+    Args:
+      lines: JSON lines (with or without their newline), blank lines are
+        skipped.
+      path: Path of the `.jsonl.zst` file.
+      frame_lines: Number of lines per frame.
+      level: zstd compression level.
+
+    Returns:
+      The FrameIndex of the written file.
+    """
+    require_zstandard()
+    compressor = zstandard.ZstdCompressor(level=level)
+    offsets = array("Q", [0])
+    line_starts = array("Q", [0])
+
+    with open(path + ".tmp", "wb") as f:
+
+        def write_frame(batch):
+            frame = compressor.compress("".join(batch).encode("utf-8"))
+            f.write(frame)
+            offsets.append(offsets[-1] + len(frame))
+            line_starts.append(line_starts[-1] + len(batch))
+
+        frame = []
+        for line in lines:
+            if not line.strip():
+                continue
+            frame.append(line if line.endswith("\n") else line + "\n")
+            if len(frame) == frame_lines:
+                write_frame(frame)
+                frame = []
+        if frame:
+            write_frame(frame)
+    os.replace(path + ".tmp", path)
+
+    index = FrameIndex(path, offsets, line_starts)
+    index.save()
+    return index
+
+
+def compress_jsonl(path, remove=False, **kwargs):
+    """Compresses a JSONL file to `{path}.zst`, see `write_compressed_jsonl`.
+
+    With `remove`, the JSONL file and its line index are deleted.
+    """
+    with open(path, encoding="utf-8") as f:
+        write_compressed_jsonl(f, path + COMPRESSED_SUFFIX, **kwargs)
+    if remove:
+        for file_path in [path, path + ".idx"]:
+            if os.path.exists(file_path):
+                os.unlink(file_path)
+    return path + COMPRESSED_SUFFIX
+
+
+class CompressedJsonl(object):
+    """Examples of a `.jsonl.zst` file, decompressed a frame at a time."""
+
+    def __init__(self, path):
+        require_zstandard()
+        self.path = path
+        self._index = None
+        self._file = None
+        self._pid = None
+        self._frame_id = None
+        self._frame = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = FrameIndex.open(self.path)
+        return self._index
+
+    def __len__(self):
+        return len(self.index)
+
+    def _reader(self):
+        # File handles must not be shared with forked worker processes.
+        if self._file is None or self._pid != os.getpid():
+            self._file = open(self.path, "rb")
+            self._pid = os.getpid()
+        return self._file
+
+    def frame(self, frame_id):
+        """Returns the lines of a frame, caching the last one read."""
+        if frame_id != self._frame_id:
+            offsets = self.index.offsets
+            reader = self._reader()
+            reader.seek(offsets[frame_id])
+            data = reader.read(offsets[frame_id + 1] - offsets[frame_id])
+            self._frame = decompress_frame(data).splitlines()
+            self._frame_id = frame_id
+        return self._frame
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("example index out of range")
+        frame_id = self.index.frame_of(i)
+        line = self.frame(frame_id)[i - self.index.line_starts[frame_id]]
+        return json.loads(line)
+
+    def read(self, start, stop):
+        """Returns the examples of a range, e.g. the shard of a worker."""
+        start, stop = max(start, 0), min(stop, len(self))
+        examples = []
+        line = start
+        while line < stop:
+            frame_id = self.index.frame_of(line)
+            frame_start = self.index.line_starts[frame_id]
+            frame = self.frame(frame_id)
+            end = min(stop, self.index.line_starts[frame_id + 1])
+            examples.extend(
+                json.loads(frame[i - frame_start]) for i in range(line, end)
+            )
+            line = end
+        return examples
+
+    def lines(self):
+        """Yields the lines of the file, without their newline."""
+        for frame_id in range(self.index.num_frames):
+            for line in self.frame(frame_id):
+                yield line.decode("utf-8")
+
+    def __iter__(self):
+        for line in self.lines():
+            yield json.loads(line)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def iter_lines(path):
+    """Yields the lines of a JSONL file, `.jsonl` or `.jsonl.zst`.
+
+    Lines keep their newline, as when iterating over an open file.
+    """
+    if path.endswith(COMPRESSED_SUFFIX):
+        reader = CompressedJsonl(path)
+        try:
+            for line in reader.lines():
+                yield line + "\n"
+        finally:
+            reader.close()
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from f
@@ -0,0 +1,241 @@
+"""Content-addressed deduplication of the SQLite databases of `unified/`.
+
+Many datasets ship the same databases (e.g. Spider's in Spider-Syn, Spider-DK,
+SParC and CoSQL). Identical files are linked instead of copied: reflinked
+(copy-on-write) where the file system supports it, hardlinked otherwise.
+
+The SHA-256 of every database of a dataset is recorded in its
+`database_manifest.json`, keyed by path relative to the dataset folder, so
+downstream caches can key on database contents.
+
+Hardlinked databases share their contents, so they must only be opened
+read-only (e.g. `sqlite3.connect(f"file:{path}?mode=ro", uri=True)`), and
+converters replace them with `DatabaseStore.copy` instead of writing into
+them.
+
+Usage example:
+  python3 -m unified_text2sql_benchmark.deduplicate_databases
+"""
+
+import os
+import glob
+import json
+import shutil
+import hashlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from unified_text2sql_benchmark.line_index import file_fingerprint
+
+UNIFIED_DIR = "unified"
+MANIFEST_FILE = "database_manifest.json"
+DATABASE_SUFFIX = ".sqlite"
+
+# ioctl of Linux to share the extents of a file (btrfs, XFS, ...).
+FICLONE = 0x40049409
+
+
+def sha256_file(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def reflink(source, destination):
+    if fcntl is None:
+        raise OSError("Reflinks are not supported on this platform")
+    try:
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        os.unlink(destination)
+        raise
+
+
+def link_file(source, destination):
+    """Makes `destination` a reflink, hardlink or copy of `source`.
+
+    Returns:
+      The method used: `reflink`, `hardlink` or `copy`.
+    """
+    if os.path.lexists(destination):
+        # Never write into an existing file, it may be linked to others.
+        os.unlink(destination)
+    try:
+        reflink(source, destination)
+        return "reflink"
+    except OSError:
+        pass
+    try:
+        os.link(source, destination)
+        return "hardlink"
+    except OSError:
+        shutil.copy2(source, destination)
+        return "copy"
+
+
+def read_manifest(dataset_dir):
+    """Returns the {relative path: entry} manifest of a dataset, if any."""
+    path = os.path.join(dataset_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+class DatabaseStore(object):
+    """Databases of a `unified/` folder, indexed by size and content hash.
+
+    Only the databases of the same size as a new one are hashed to find a
+    copy of it, and hashes are cached in the manifests of the datasets.
+    """
+
+    def __init__(self, unified_dir=UNIFIED_DIR):
+        self.unified_dir = unified_dir
+        self.manifests = {}
+        self.dirty = set()
+        self.files_by_size = {}
+        self.saved_bytes = 0
+        for path in glob.glob(
+            os.path.join(unified_dir, "*", "database", "**", "*.sqlite"),
+            recursive=True,
+        ):
+            self.files_by_size.setdefault(os.path.getsize(path), []).append(
+                os.path.abspath(path)
+            )
+
+    def _manifest_key(self, path):
+        """Returns the (dataset, relative path) of a path of `unified/`."""
+        relative_path = os.path.relpath(path, self.unified_dir)
+        if relative_path.startswith(os.pardir):
+            return None, None
+        dataset, relative_path = relative_path.split(os.sep, 1)
+        if dataset not in self.manifests:
+            self.manifests[dataset] = read_manifest(
+                os.path.join(self.unified_dir, dataset)
+            )
+        return dataset, relative_path.replace(os.sep, "/")
+
+    def hash(self, path):
+        """Returns the SHA-256 of a file, cached in the manifests."""
+        size, mtime_ns = file_fingerprint(path)
+        dataset, key = self._manifest_key(path)
+        if dataset is None:
+            return sha256_file(path)
+
+        entry = self.manifests[dataset].get(key)
+        if entry and (entry["size"], entry["mtime_ns"]) == (size, mtime_ns):
+            return entry["sha256"]
+        sha256 = sha256_file(path)
+        self._record(path, sha256)
+        return sha256
+
+    def _record(self, path, sha256):
+        dataset, key = self._manifest_key(path)
+        if dataset is None:
+            return
+        size, mtime_ns = file_fingerprint(path)
+        self.manifests[dataset][key] = {
+            "sha256": sha256,
+            "size": size,
+            "mtime_ns": mtime_ns,
+        }
+        self.dirty.add(dataset)
+
+    def find(self, sha256, size, exclude=None):
+        """Returns a database of `unified/` with this content, if any."""
+        for path in self.files_by_size.get(size, []):
+            if path == exclude or not os.path.exists(path):
+                continue
+            if exclude and os.path.exists(exclude):
+                if os.path.samefile(path, exclude):
+                    continue
+            if self.hash(path) == sha256:
+                return path
+        return None
+
+    def _add(self, path, sha256):
+        path = os.path.abspath(path)
+        paths = self.files_by_size.setdefault(os.path.getsize(path), [])
+        if path not in paths:
+            paths.append(path)
+        self._record(path, sha256)
+
+    def copy(self, source, destination):
+        """Copies a database, linking it to an identical one if possible."""
+        size = os.path.getsize(source)
+        sha256 = self.hash(source)
+        destination = os.path.abspath(destination)
+        if os.path.abspath(source).startswith(
+            os.path.abspath(self.unified_dir) + os.sep
+        ):
+            # Databases copied within `unified/` are the copy to link to.
+            self._add(source, sha256)
+        match = self.find(sha256, size, exclude=destination)
+
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if match is None:
+            if os.path.lexists(destination):
+                os.unlink(destination)
+            shutil.copy2(source, destination)
+        else:
+            link_file(match, destination)
+            self.saved_bytes += size
+        self._add(destination, sha256)
+
+    def copytree(self, source_dir, destination_dir):
+        """Copies a folder like `shutil.copytree`, linking identical databases.
+
+        Existing files are replaced rather than written into.
+        """
+        for root, _, names in os.walk(source_dir):
+            relative_dir = os.path.relpath(root, source_dir)
+            target_dir = os.path.join(destination_dir, relative_dir)
+            os.makedirs(target_dir, exist_ok=True)
+            for name in names:
+                source = os.path.join(root, name)
+                destination = os.path.join(target_dir, name)
+                if name.endswith(DATABASE_SUFFIX):
+                    self.copy(source, destination)
+                else:
+                    if os.path.lexists(destination):
+                        os.unlink(destination)
+                    shutil.copy2(source, destination)
+
+    def deduplicate(self, dataset_dir):
+        """Links the databases of a dataset to identical ones of `unified/`."""
+        for path in sorted(
+            glob.glob(
+                os.path.join(dataset_dir, "database", "**", "*.sqlite"),
+                recursive=True,
+            )
+        ):
+            path = os.path.abspath(path)
+            size = os.path.getsize(path)
+            sha256 = self.hash(path)
+            match = self.find(sha256, size, exclude=path)
+            if match is not None:
+                link_file(match, path)
+                self.saved_bytes += size
+            self._add(path, sha256)
+
+    def save(self):
+        """Writes the manifests of the datasets with new or changed entries."""
+        for dataset in sorted(self.dirty):
+            dataset_dir = os.path.join(self.unified_dir, dataset)
+            manifest = {
+                key: entry
+                for key, entry in sorted(self.manifests[dataset].items())
+                if os.path.exists(os.path.join(dataset_dir, key))
+            }
+            path = os.path.join(dataset_dir, MANIFEST_FILE)
+            with open(path + ".tmp", "w") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(path + ".tmp", path)
+        self.dirty = set()
+
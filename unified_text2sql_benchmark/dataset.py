@@ -0,0 +1,299 @@
+"""Lazy object model of the unified datasets.
+
+Usage example:
+  benchmark = UnifiedBenchmark("unified")
+  spider = benchmark["spider"]
+  dev = spider["dev"]
+  example = dev[42]
+  schema = spider.schema(example["db_id"])
+  database_path = spider.database_path(example["db_id"])
+"""
+
+import os
+import glob
+import json
+
+from unified_text2sql_benchmark.compressed_jsonl import (
+    COMPRESSED_SUFFIX,
+    CompressedJsonl,
+)
+from unified_text2sql_benchmark.database_store import (
+    read_manifest,
+    sha256_file,
+)
+from unified_text2sql_benchmark.line_index import LineIndex, file_fingerprint
+from unified_text2sql_benchmark.schema import load_schemas
+from unified_text2sql_benchmark.schema_index import SchemaIndex
+from unified_text2sql_benchmark.schema_serialization import (
+    SchemaSerializations,
+)
+from unified_text2sql_benchmark.value_index import ValueIndex
+
+UNIFIED_DIR = "unified"
+
+# Schemas, as a JSON list or as one JSON object per line.
+TABLES_FILES = ["tables.json", "tables.jsonl"]
+
+
+def split_files(dataset_dir):
+    """Returns the paths of the splits of a dataset folder, by split name.
+
+    A compressed `train.jsonl.zst` is only used without `train.jsonl`.
+    """
+    paths = {}
+    for suffix in [".jsonl", ".jsonl" + COMPRESSED_SUFFIX]:
+        for path in sorted(glob.glob(os.path.join(dataset_dir, "*" + suffix))):
+            name = os.path.basename(path)[: -len(suffix)]
+            if name != "tables" and name not in paths:
+                paths[name] = path
+    return dict(sorted(paths.items()))
+
+
+class Split(object):
+    """Examples of a JSONL file, read lazily.
+
+    Iterating streams the file, and `split[i]` seeks to the i-th example
+    through a persisted line-offset index, so examples can be shuffled without
+    loading the whole split. Compressed splits (`.jsonl.zst`) are read through
+    their frame index instead, see `compressed_jsonl`.
+    """
+
+    def __init__(self, dataset, name, path):
+        self.dataset = dataset
+        self.name = name
+        self.path = path
+        self._index = None
+        self._file = None
+        self._pid = None
+        self._compressed = None
+        if path.endswith(COMPRESSED_SUFFIX):
+            self._compressed = CompressedJsonl(path)
+
+    def __repr__(self):
+        return f"Split({self.dataset.name}/{self.name})"
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = LineIndex.open(self.path)
+        return self._index
+
+    def __len__(self):
+        if self._compressed is not None:
+            return len(self._compressed)
+        return len(self.index)
+
+    def _reader(self):
+        # File handles must not be shared with forked worker processes.
+        if self._file is None or self._pid != os.getpid():
+            self._file = open(self.path, "rb")
+            self._pid = os.getpid()
+        return self._file
+
+    def __getitem__(self, i):
+        if self._compressed is not None:
+            return self._compressed[i]
+        reader = self._reader()
+        reader.seek(self.index[i])
+        return json.loads(reader.readline())
+
+    def read(self, start, stop):
+        """Returns the examples of a range, e.g. the shard of a worker."""
+        if self._compressed is not None:
+            return self._compressed.read(start, stop)
+        start, stop = max(start, 0), min(stop, len(self))
+        if start >= stop:
+            return []
+        reader = self._reader()
+        reader.seek(self.index[start])
+        examples = []
+        while len(examples) < stop - start:
+            line = reader.readline()
+            if line.strip():
+                examples.append(json.loads(line))
+        return examples
+
+    def __iter__(self):
+        if self._compressed is not None:
+            yield from self._compressed
+            return
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def close(self):
+        if self._compressed is not None:
+            self._compressed.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Dataset(object):
+    """A unified dataset: its splits, schemas and SQLite databases."""
+
+    def __init__(self, name, root=UNIFIED_DIR):
+        self.name = name
+        self.path = os.path.join(root, name)
+        if not os.path.isdir(self.path):
+            raise ValueError(f"No unified dataset at {self.path}")
+        self._splits = None
+        self._schemas = None
+        self._schema_index = None
+        self._schema_cache = {}
+        self._compact_schemas = None
+        self._schema_serializations = None
+        self._value_index = None
+        self._database_paths = {}
+        self._database_manifest = None
+
+    def __repr__(self):
+        return f"Dataset({self.name})"
+
+    @property
+    def splits(self):
+        """Splits of the dataset by name, e.g. `train` for `train.jsonl`.
+
+        A compressed `train.jsonl.zst` is only used without `train.jsonl`.
+        """
+        if self._splits is None:
+            self._splits = {
+                name: Split(self, name, path)
+                for name, path in split_files(self.path).items()
+            }
+        return self._splits
+
+    def __getitem__(self, split):
+        return self.splits[split]
+
+    def __iter__(self):
+        return iter(self.splits.values())
+
+    @property
+    def schemas(self):
+        """Schemas of the dataset by db_id, loaded on first use."""
+        if self._schemas is None:
+            self._schemas = {}
+            path = self.tables_path
+            if path is not None:
+                with open(path) as f:
+                    if path.endswith(".jsonl"):
+                        schemas = [
+                            json.loads(line) for line in f if line.strip()
+                        ]
+                    else:
+                        schemas = json.load(f)
+                for schema in schemas:
+                    self._schemas[schema["db_id"]] = schema
+        return self._schemas
+
+    @property
+    def tables_path(self):
+        for tables_file in TABLES_FILES:
+            path = os.path.join(self.path, tables_file)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @property
+    def schema_index(self):
+        if self._schema_index is None:
+            if self.tables_path is None:
+                raise FileNotFoundError(f"No tables.json in {self.path}")
+            self._schema_index = SchemaIndex.open(self.tables_path)
+        return self._schema_index
+
+    @property
+    def compact_schemas(self):
+        """Schemas of the dataset by db_id, as memory-compact `Schema`s."""
+        if self._compact_schemas is None:
+            path = self.tables_path
+            self._compact_schemas = load_schemas(path) if path else {}
+        return self._compact_schemas
+
+    @property
+    def schema_serializations(self):
+        """Serializations written by `build_schema_serializations`."""
+        if self._schema_serializations is None:
+            self._schema_serializations = SchemaSerializations.load(self.path)
+        return self._schema_serializations
+
+    @property
+    def value_index(self):
+        """Index of the cell values written by `build_value_indexes`."""
+        if self._value_index is None:
+            self._value_index = ValueIndex.open(self.path)
+        return self._value_index
+
+    def schema(self, db_id):
+        """Returns the schema of a db_id.
+
+        Unless all the schemas are already loaded, only this schema is read,
+        through the index of the tables.json file.
+        """
+        if self._schemas is not None:
+            return self._schemas[db_id]
+        if db_id not in self._schema_cache:
+            self._schema_cache[db_id] = self.schema_index.get(db_id)
+        return self._schema_cache[db_id]
+
+    def database_path(self, db_id):
+        """Returns the path of the SQLite database of a db_id.
+
+        Databases are usually at `database/{db_id}/{db_id}.sqlite`, otherwise
+        the only SQLite file of `database/{db_id}/` is used.
+        """
+        if db_id not in self._database_paths:
+            database_dir = os.path.join(self.path, "database", db_id)
+            path = os.path.join(database_dir, f"{db_id}.sqlite")
+            if not os.path.exists(path):
+                candidates = glob.glob(os.path.join(database_dir, "*.sqlite"))
+                if len(candidates) != 1:
+                    raise FileNotFoundError(
+                        f"No SQLite database for {db_id} in {database_dir}"
+                    )
+                path = candidates[0]
+            self._database_paths[db_id] = path
+        return self._database_paths[db_id]
+
+    def database_hash(self, db_id):
+        """Returns the SHA-256 of the SQLite database of a db_id.
+
+        Hashes are read from `database_manifest.json` when up to date, see
+        `database_store`.
+        """
+        path = self.database_path(db_id)
+        if self._database_manifest is None:
+            self._database_manifest = read_manifest(self.path)
+        key = os.path.relpath(path, self.path).replace(os.sep, "/")
+        entry = self._database_manifest.get(key)
+        if entry and (entry["size"], entry["mtime_ns"]) == file_fingerprint(
+            path
+        ):
+            return entry["sha256"]
+        return sha256_file(path)
+
+
+class UnifiedBenchmark(object):
+    """All the unified datasets of a `unified/` folder."""
+
+    def __init__(self, root=UNIFIED_DIR):
+        self.root = root
+        self._datasets = {}
+
+    @property
+    def names(self):
+        return sorted(
+            name
+            for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def __getitem__(self, name):
+        if name not in self._datasets:
+            self._datasets[name] = Dataset(name, self.root)
+        return self._datasets[name]
+
+    def __iter__(self):
+        return (self[name] for name in self.names)
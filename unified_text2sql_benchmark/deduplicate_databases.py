@@ -0,0 +1,41 @@
+"""Deduplicates the SQLite databases of an existing `unified/` folder.
+
+Usage example:
+  python3 -m unified_text2sql_benchmark.deduplicate_databases
+"""
+
+import os
+import argparse
+
+from unified_text2sql_benchmark.database_store import (
+    UNIFIED_DIR,
+    DatabaseStore,
+)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--unified_dir", type=str, default=UNIFIED_DIR)
+    parser.add_argument(
+        "--datasets",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Datasets to deduplicate, all of them by default.",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    store = DatabaseStore(args.unified_dir)
+    datasets = args.datasets or sorted(
+        name
+        for name in os.listdir(args.unified_dir)
+        if os.path.isdir(os.path.join(args.unified_dir, name))
+    )
+    for dataset in datasets:
+        store.deduplicate(os.path.join(args.unified_dir, dataset))
+    store.save()
+    saved_gib = store.saved_bytes / 2**30
+    print(f"Linked {saved_gib:.2f} GiB of duplicate databases")
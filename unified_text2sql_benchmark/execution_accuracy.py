@@ -0,0 +1,516 @@
+"""Execution accuracy of predicted queries on any of the unified datasets.
+
+Predictions are read from a JSONL file with one
+`{"dataset", "split", "index", "prediction"}` record per example, where
+`index` is the line of the example in `unified/{dataset}/{split}.jsonl`, so
+a single file can hold predictions for every dataset.
+
+The examples are grouped by database, and every database is assigned to one
+of the worker processes (largest first, to the least loaded one), so it is
+only read by a process that keeps its connection open and its page cache
+hot. Only a database with more than a worker's share of the examples is
+split over several workers.
+
+A prediction is correct when its results equal those of the gold query, as
+sets of rows unless the gold query has an ORDER BY.
+
+Usage example:
+  python3 -m unified_text2sql_benchmark.execution_accuracy \
+      --predictions predictions.jsonl --workers 16 --output metrics.json
+"""
+
+import os
+import json
+import time
+import heapq
+import sqlite3
+import argparse
+import warnings
+import multiprocessing
+from queue import Empty
+from collections import OrderedDict
+
+from tqdm import tqdm
+
+from unified_text2sql_benchmark.dataset import UNIFIED_DIR, UnifiedBenchmark
+
+# Maximum execution time of a query, in seconds.
+TIMEOUT = 60
+
+# Number of examples evaluated by a worker before sending their records.
+CHUNK_SIZE = 200
+
+# Number of connections kept open by every worker.
+MAX_CONNECTIONS = 8
+
+# Number of SQLite virtual machine instructions between timeout checks.
+PROGRESS_STEPS = 10000
+
+# These are substrings of exceptions from sqlite3 that indicate certain classes
+# of schema and syntax errors.
+SCHEMA_INCOHERENCE_STRINGS = {
+    "no such table",
+    "no such column",
+    "ambiguous column name",
+}
+SYNTAX_INCORRECTNESS_STRINGS = {
+    "bad syntax",
+    "unrecognized token",
+    "incomplete input",
+    "misuse of aggregate",
+    "left and right",
+    "wrong number of arguments",
+    "sub-select returns",
+    "1st order by term does not match any column",
+    "no such function",
+    "clause is required before",
+    "incorrect number of bindings",
+    "datatype mismatch",
+    "syntax error",
+}
+
+# Connections of a worker process, by database path.
+_connections = OrderedDict()
+
+
+class ExecutionMetrics(object):
+    """Counts of the evaluated examples of a dataset, split or benchmark.
+
+    `missing` examples have no prediction and `skipped` ones have no database
+    or a gold query failing to execute, they are not counted as correct.
+    """
+
+    FIELDS = [
+        "num_examples",
+        "exec_correct",
+        "missing",
+        "skipped",
+        "schema_errors",
+        "syntax_errors",
+        "timeouts",
+        "other_errors",
+    ]
+
+    def __init__(self, **counts):
+        for field in self.FIELDS:
+            setattr(self, field, counts.get(field, 0))
+
+    def add(self, record):
+        self.num_examples += 1
+        self.exec_correct += int(record["correct"])
+        error_type = record["error_type"]
+        if error_type in ("missing", "skipped"):
+            setattr(self, error_type, getattr(self, error_type) + 1)
+        elif error_type == "timeout":
+            self.timeouts += 1
+        elif error_type is not None:
+            field = f"{error_type}_errors"
+            setattr(self, field, getattr(self, field) + 1)
+
+    def merge(self, other):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    @property
+    def exec_accuracy(self):
+        evaluated = self.num_examples - self.skipped
+        return self.exec_correct / evaluated if evaluated else 0.0
+
+    def to_dict(self):
+        counts = {field: getattr(self, field) for field in self.FIELDS}
+        counts["exec_accuracy"] = self.exec_accuracy
+        return counts
+
+
+def classify_error(exception_str):
+    """Returns `schema`, `syntax`, `timeout` or `other`."""
+    if exception_str == "timeout":
+        return "timeout"
+    for substring in SCHEMA_INCOHERENCE_STRINGS:
+        if substring in exception_str:
+            return "schema"
+    for substring in SYNTAX_INCORRECTNESS_STRINGS:
+        if substring in exception_str:
+            return "syntax"
+    return "other"
+
+
+def get_connection(database_path):
+    """Returns a read-only connection of this process to a database."""
+    if database_path in _connections:
+        _connections.move_to_end(database_path)
+        return _connections[database_path]
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    conn.text_factory = lambda b: b.decode("utf-8", errors="replace")
+    _connections[database_path] = conn
+    while len(_connections) > MAX_CONNECTIONS:
+        _connections.popitem(last=False)[1].close()
+    return conn
+
+
+def execute_query(conn, query, timeout=TIMEOUT):
+    """Executes a query, interrupting it after `timeout` seconds.
+
+    Returns:
+      A (rows, exception string) tuple, rows being None on errors.
+    """
+    deadline = time.monotonic() + timeout
+    conn.set_progress_handler(
+        lambda: time.monotonic() > deadline, PROGRESS_STEPS
+    )
+    try:
+        return conn.execute(query).fetchall(), None
+    except sqlite3.Error as e:
+        if time.monotonic() > deadline:
+            return None, "timeout"
+        return None, str(e).lower()
+    except Exception as e:
+        # E.g. queries with several statements, or invalid UTF-8.
+        return None, str(e).lower()
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def results_match(pred_results, gold_results, ordered):
+    """Compares result tables, as lists if ordered and as sets otherwise."""
+    if ordered:
+        return pred_results == gold_results
+    pred_set = {" ".join(str(item) for item in row) for row in pred_results}
+    gold_set = {" ".join(str(item) for item in row) for row in gold_results}
+    return pred_set == gold_set
+
+
+def evaluate_chunk(chunk):
+    """Evaluates examples of the same database, in a worker process.
+
+    Args:
+      chunk: (database path, timeout, examples) tuple, examples being
+        `{"dataset", "split", "index", "db_id", "gold", "prediction"}`
+        dictionaries.
+
+    Returns:
+      The examples, with their `correct` and `error_type` and the `exception`
+      of the prediction.
+    """
+    database_path, timeout, examples = chunk
+    if database_path is None:
+        conn = None
+    else:
+        conn = get_connection(database_path)
+    results = {}
+
+    records = []
+    for example in examples:
+        record = {
+            key: example[key] for key in ["dataset", "split", "index", "db_id"]
+        }
+        record.update(correct=False, error_type=None, exception=None)
+        records.append(record)
+        gold, prediction = example["gold"], example["prediction"]
+        if conn is None:
+            record["error_type"] = "skipped"
+            record["exception"] = "no database"
+            continue
+        if gold not in results:
+            results[gold] = execute_query(conn, gold, timeout)
+        gold_results, gold_exception = results[gold]
+        if gold_exception is not None:
+            record["error_type"] = "skipped"
+            record["exception"] = f"gold: {gold_exception}"
+            continue
+        if prediction is None:
+            record["error_type"] = "missing"
+            continue
+
+        if prediction not in results:
+            results[prediction] = execute_query(conn, prediction, timeout)
+        pred_results, exception = results[prediction]
+        if exception is not None:
+            record["error_type"] = classify_error(exception)
+            record["exception"] = exception
+            continue
+        record["correct"] = results_match(
+            pred_results, gold_results, "order by" in gold.lower()
+        )
+    return records
+
+
+def read_predictions(path):
+    """Returns the predictions of a JSONL file by (dataset, split, index)."""
+    predictions = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key = (record["dataset"], record["split"], int(record["index"]))
+            predictions[key] = record["prediction"]
+    return predictions
+
+
+def group_examples(benchmark, predictions):
+    """Groups the examples of the predicted splits by database.
+
+    Every example of a predicted split is evaluated, those without a
+    prediction are counted as missing. Predictions of unknown datasets or
+    splits raise a ValueError, and those of examples outside of their split
+    (e.g. an off by one index) are counted and warned about.
+
+    Returns:
+      A ([(database path, examples)], number of unmatched predictions) tuple,
+      the database path being None for missing databases.
+    """
+    splits = sorted({(dataset, split) for dataset, split, _ in predictions})
+    by_database = {}
+    matched = 0
+    for dataset_name, split_name in splits:
+        if dataset_name not in benchmark.names:
+            raise ValueError(f"Predictions of unknown dataset {dataset_name}")
+        dataset = benchmark[dataset_name]
+        if split_name not in dataset.splits:
+            raise ValueError(
+                f"Predictions of unknown split {dataset_name}/{split_name}"
+            )
+        for index, example in enumerate(dataset[split_name]):
+            db_id = example["db_id"]
+            try:
+                database_path = dataset.database_path(db_id)
+            except FileNotFoundError:
+                database_path = None
+            key = (dataset_name, split_name, index)
+            matched += key in predictions
+            by_database.setdefault(
+                (database_path or f"{dataset_name}/{db_id}", database_path),
+                [],
+            ).append(
+                {
+                    "dataset": dataset_name,
+                    "split": split_name,
+                    "index": index,
+                    "db_id": db_id,
+                    "gold": example["query"],
+                    "prediction": predictions.get(key),
+                }
+            )
+
+    unmatched = len(predictions) - matched
+    if unmatched:
+        warnings.warn(
+            f"{unmatched} predictions have an index outside of their split, "
+            "they are ignored"
+        )
+    groups = [
+        (database_path, examples)
+        for (_, database_path), examples in by_database.items()
+    ]
+    return groups, unmatched
+
+
+def assign_chunks(groups, workers, timeout, chunk_size=CHUNK_SIZE):
+    """Assigns the databases to workers, and splits their work in chunks.
+
+    Databases are assigned whole, largest first, to the least loaded worker,
+    so each one is only read by a single process. Only databases with more
+    than a worker's share of the examples are split, over as few workers as
+    possible.
+
+    Returns:
+      A list of chunks per worker, see `evaluate_chunk`.
+    """
+    total = sum(len(examples) for _, examples in groups)
+    share = max(1, -(-total // workers))
+    parts = []
+    for database_path, examples in groups:
+        num_parts = -(-len(examples) // share)
+        size = -(-len(examples) // num_parts)
+        for start in range(0, len(examples), size):
+            parts.append((database_path, examples[start : start + size]))
+    parts.sort(key=lambda part: -len(part[1]))
+
+    loads = [(0, worker) for worker in range(workers)]
+    assigned = [[] for _ in range(workers)]
+    for database_path, examples in parts:
+        load, worker = heapq.heappop(loads)
+        for start in range(0, len(examples), chunk_size):
+            assigned[worker].append(
+                (database_path, timeout, examples[start : start + chunk_size])
+            )
+        heapq.heappush(loads, (load + len(examples), worker))
+    return assigned
+
+
+def evaluate_worker(chunks, queue):
+    """Evaluates the chunks of a worker, sending their records to a queue."""
+    for chunk in chunks:
+        queue.put(evaluate_chunk(chunk))
+    queue.put(None)
+
+
+def evaluate_predictions(
+    predictions,
+    unified_dir=UNIFIED_DIR,
+    workers=None,
+    timeout=TIMEOUT,
+    chunk_size=CHUNK_SIZE,
+    records_file=None,
+):
+    """Computes the execution accuracy of predictions on unified datasets.
+
+    Args:
+      predictions: {(dataset, split, index): predicted query} dictionary, see
+        `read_predictions`.
+      unified_dir: Folder of the unified datasets.
+      workers: Number of worker processes, all the cores by default.
+      timeout: Maximum execution time of a query, in seconds.
+      chunk_size: Number of examples sent back by a worker at a time.
+      records_file: Optional file to write a JSON record per example to.
+
+    Returns:
+      A {"unmatched_predictions", "overall", "datasets", "splits"} dictionary
+      of metrics, splits being keyed by `{dataset}/{split}`. `overall` sums
+      the counts of all the datasets and also has the `macro_exec_accuracy`
+      of the datasets.
+    """
+    benchmark = UnifiedBenchmark(unified_dir)
+    groups, unmatched = group_examples(benchmark, predictions)
+    workers = workers or os.cpu_count() or 1
+    assigned = assign_chunks(groups, workers, timeout, chunk_size)
+
+    queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=evaluate_worker, args=(chunks, queue))
+        for chunks in assigned
+    ]
+    for process in processes:
+        process.start()
+
+    split_metrics = {}
+    try:
+        total = sum(len(examples) for _, examples in groups)
+        with tqdm(total=total) as progress:
+            running = len(processes)
+            while running:
+                try:
+                    records = queue.get(timeout=1)
+                except Empty:
+                    if any(process.exitcode for process in processes):
+                        raise RuntimeError("An evaluation worker failed")
+                    continue
+                if records is None:
+                    running -= 1
+                    continue
+                for record in records:
+                    key = (record["dataset"], record["split"])
+                    split_metrics.setdefault(key, ExecutionMetrics()).add(
+                        record
+                    )
+                    if records_file is not None:
+                        records_file.write(json.dumps(record) + "\n")
+                progress.update(len(records))
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    dataset_metrics = {}
+    overall = ExecutionMetrics()
+    for (dataset, _), metrics in sorted(split_metrics.items()):
+        dataset_metrics.setdefault(dataset, ExecutionMetrics()).merge(metrics)
+        overall.merge(metrics)
+
+    result = {
+        "unmatched_predictions": unmatched,
+        "overall": overall.to_dict(),
+        "datasets": {
+            name: metrics.to_dict()
+            for name, metrics in dataset_metrics.items()
+        },
+        "splits": {
+            f"{dataset}/{split}": metrics.to_dict()
+            for (dataset, split), metrics in sorted(split_metrics.items())
+        },
+    }
+    accuracies = [
+        metrics.exec_accuracy for metrics in dataset_metrics.values()
+    ]
+    result["overall"]["macro_exec_accuracy"] = (
+        sum(accuracies) / len(accuracies) if accuracies else 0.0
+    )
+    return result
+
+
+def format_metrics(result):
+    """Returns the metrics of the datasets and overall as a text table."""
+    rows = [("dataset", "examples", "exec_acc", "missing", "skipped")]
+    for name, metrics in [
+        *result["splits"].items(),
+        *result["datasets"].items(),
+        ("overall", result["overall"]),
+    ]:
+        rows.append(
+            (
+                name,
+                str(metrics["num_examples"]),
+                f"{metrics['exec_accuracy']:.4f}",
+                str(metrics["missing"]),
+                str(metrics["skipped"]),
+            )
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(value.ljust(width) for value, width in zip(row, widths))
+        for row in rows
+    )
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--unified_dir", type=str, default=UNIFIED_DIR)
+    parser.add_argument(
+        "--predictions",
+        type=str,
+        required=True,
+        help="JSONL file of `dataset`, `split`, `index` and `prediction`.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes, all the cores by default.",
+    )
+    parser.add_argument("--timeout", type=float, default=TIMEOUT)
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE)
+    parser.add_argument(
+        "--output", type=str, default=None, help="JSON file of the metrics."
+    )
+    parser.add_argument(
+        "--records",
+        type=str,
+        default=None,
+        help="JSONL file of the evaluation of every example.",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    records_file = None
+    if args.records:
+        records_file = open(args.records, "w", buffering=1 << 20)
+    try:
+        result = evaluate_predictions(
+            read_predictions(args.predictions),
+            args.unified_dir,
+            args.workers,
+            args.timeout,
+            args.chunk_size,
+            records_file,
+        )
+    finally:
+        if records_file is not None:
+            records_file.close()
+    print(format_metrics(result))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
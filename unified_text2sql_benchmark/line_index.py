@@ -0,0 +1,91 @@
+"""Persisted byte offsets of the lines of a JSONL file."""
+
+import os
+import sys
+from array import array
+
+INDEX_SUFFIX = ".idx"
+
+# Header of the index file: file size and modification time of the indexed
+# file, and number of lines.
+HEADER_SIZE = 3
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class LineIndex(object):
+    """Byte offsets of the non-blank lines of a file, for O(1) random access.
+
+    The offsets are persisted next to the file (`{path}.idx`) and rebuilt when
+    the file changes, so a file is only scanned once across processes and runs.
+    """
+
+    def __init__(self, path, offsets):
+        self.path = path
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        return self.offsets[i]
+
+    @staticmethod
+    def build(path):
+        """Scans a file for the offsets of its non-blank lines."""
+        offsets = array("Q")
+        offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    offsets.append(offset)
+                offset += len(line)
+        return LineIndex(path, offsets)
+
+    def save(self, index_path=None):
+        index_path = index_path or self.path + INDEX_SUFFIX
+        data = array("Q", [*file_fingerprint(self.path), len(self.offsets)])
+        data.extend(self.offsets)
+        if sys.byteorder == "big":
+            data.byteswap()
+        with open(index_path + ".tmp", "wb") as f:
+            data.tofile(f)
+        os.replace(index_path + ".tmp", index_path)
+
+    @staticmethod
+    def load(path, index_path=None):
+        """Returns the persisted index of a file, None if missing or stale."""
+        index_path = index_path or path + INDEX_SUFFIX
+        if not os.path.exists(index_path):
+            return None
+
+        data = array("Q")
+        with open(index_path, "rb") as f:
+            data.frombytes(f.read())
+        if sys.byteorder == "big":
+            data.byteswap()
+
+        if len(data) < HEADER_SIZE or len(data) != HEADER_SIZE + data[2]:
+            return None
+        if tuple(data[:2]) != file_fingerprint(path):
+            return None
+        return LineIndex(path, data[HEADER_SIZE:])
+
+    @staticmethod
+    def open(path):
+        """Loads the index of a file, building and persisting it if needed.
+
+        The index is kept in memory only if it cannot be written next to the
+        file, e.g. on a read-only copy of the benchmark.
+        """
+        index = LineIndex.load(path)
+        if index is None:
+            index = LineIndex.build(path)
+            try:
+                index.save()
+            except OSError:
+                pass
+        return index
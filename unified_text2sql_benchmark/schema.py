@@ -0,0 +1,278 @@
+"""Memory-compact model of the schemas of tables.json files.
+
+Names are interned, so a name repeated across tables and databases is stored
+once, column types are integer codes, and column-level fields are arrays
+instead of lists of small lists. Name and foreign key lookups are built on
+first use, so holding every schema of the benchmark stays cheap.
+
+Usage example:
+  schemas = load_schemas("unified/spider/tables.json")
+  schema = schemas["concert_singer"]
+  column_id = schema.column_id("singer", "name")
+  schema.column_type(column_id)
+"""
+
+import sys
+import json
+from array import array
+
+# Column types of `schema_generator.dump_db_json_schema`, unseen types are
+# assigned the next codes.
+COLUMN_TYPES = ["text", "number", "time", "boolean", "others"]
+_TYPE_CODES = {column_type: i for i, column_type in enumerate(COLUMN_TYPES)}
+
+# Keys of a tables.json entry, other keys are kept as they are.
+FIELDS = {
+    "db_id",
+    "table_names_original",
+    "table_names",
+    "column_names_original",
+    "column_names",
+    "column_types",
+    "primary_keys",
+    "foreign_keys",
+}
+
+
+def type_code(column_type):
+    """Returns the integer code of a column type, registering unseen types."""
+    code = _TYPE_CODES.get(column_type)
+    if code is None:
+        if len(COLUMN_TYPES) > 255:
+            raise ValueError(f"Too many column types to add {column_type}")
+        code = _TYPE_CODES[column_type] = len(COLUMN_TYPES)
+        COLUMN_TYPES.append(column_type)
+    return code
+
+
+def intern_names(names):
+    return tuple(sys.intern(name) for name in names)
+
+
+def normalize_name(name):
+    return name.lower()
+
+
+class Schema(object):
+    """Schema of a database, as in tables.json.
+
+    Column i belongs to table `column_tables[i]` (-1 for `*`), and foreign
+    keys are stored as a flat array of (column id, referenced column id)
+    pairs.
+    """
+
+    __slots__ = [
+        "db_id",
+        "table_names",
+        "table_names_original",
+        "column_tables",
+        "column_names",
+        "column_names_original",
+        "column_types",
+        "primary_keys",
+        "foreign_key_pairs",
+        "extra",
+        "_table_ids",
+        "_column_ids",
+        "_table_columns",
+        "_neighbours",
+    ]
+
+    def __init__(
+        self,
+        db_id,
+        table_names,
+        table_names_original,
+        column_tables,
+        column_names,
+        column_names_original,
+        column_types,
+        primary_keys,
+        foreign_key_pairs,
+        extra=None,
+    ):
+        self.db_id = db_id
+        self.table_names = table_names
+        self.table_names_original = table_names_original
+        self.column_tables = column_tables
+        self.column_names = column_names
+        self.column_names_original = column_names_original
+        self.column_types = column_types
+        self.primary_keys = primary_keys
+        self.foreign_key_pairs = foreign_key_pairs
+        self.extra = extra
+        self._table_ids = None
+        self._column_ids = None
+        self._table_columns = None
+        self._neighbours = None
+
+    def __repr__(self):
+        return f"Schema({self.db_id})"
+
+    @staticmethod
+    def from_dict(d):
+        """Converts a tables.json entry.
+
+        Entries without original names (e.g. spider's tables.jsonl) use the
+        normalized names for both.
+        """
+        table_names = intern_names(d["table_names"])
+        table_names_original = table_names
+        if "table_names_original" in d:
+            table_names_original = intern_names(d["table_names_original"])
+
+        column_tables = array("i", (table for table, _ in d["column_names"]))
+        column_names = intern_names(name for _, name in d["column_names"])
+        column_names_original = column_names
+        if "column_names_original" in d:
+            column_names_original = intern_names(
+                name for _, name in d["column_names_original"]
+            )
+
+        # Composite primary keys are lists of column ids.
+        primary_keys = tuple(
+            tuple(key) if isinstance(key, list) else key
+            for key in d["primary_keys"]
+        )
+        foreign_key_pairs = array(
+            "i", (column for key in d["foreign_keys"] for column in key)
+        )
+
+        extra = {key: value for key, value in d.items() if key not in FIELDS}
+        return Schema(
+            sys.intern(d["db_id"]),
+            table_names,
+            table_names_original,
+            column_tables,
+            column_names,
+            column_names_original,
+            array("B", (type_code(t) for t in d["column_types"])),
+            primary_keys,
+            foreign_key_pairs,
+            extra or None,
+        )
+
+    def to_dict(self):
+        """Converts back to a tables.json entry."""
+        d = {"db_id": self.db_id}
+        # Original names share the normalized names when they were missing.
+        if self.table_names_original is not self.table_names:
+            d["table_names_original"] = list(self.table_names_original)
+        d["table_names"] = list(self.table_names)
+        if self.column_names_original is not self.column_names:
+            d["column_names_original"] = [
+                [table, name]
+                for table, name in zip(
+                    self.column_tables, self.column_names_original
+                )
+            ]
+        d["column_names"] = [
+            [table, name]
+            for table, name in zip(self.column_tables, self.column_names)
+        ]
+        d["column_types"] = [COLUMN_TYPES[t] for t in self.column_types]
+        d["primary_keys"] = [
+            list(key) if isinstance(key, tuple) else key
+            for key in self.primary_keys
+        ]
+        d["foreign_keys"] = [list(pair) for pair in self.foreign_keys]
+        d.update(self.extra or {})
+        return d
+
+    @property
+    def num_tables(self):
+        return len(self.table_names)
+
+    @property
+    def num_columns(self):
+        return len(self.column_names)
+
+    @property
+    def foreign_keys(self):
+        pairs = self.foreign_key_pairs
+        return [(pairs[i], pairs[i + 1]) for i in range(0, len(pairs), 2)]
+
+    def column_type(self, column_id):
+        return COLUMN_TYPES[self.column_types[column_id]]
+
+    def _build_lookups(self):
+        table_ids = {}
+        for names in [self.table_names, self.table_names_original]:
+            for i, name in enumerate(names):
+                table_ids.setdefault(normalize_name(name), i)
+
+        column_ids = {}
+        table_columns = [[] for _ in self.table_names]
+        for names in [self.column_names, self.column_names_original]:
+            for i, (table, name) in enumerate(zip(self.column_tables, names)):
+                column_ids.setdefault((table, normalize_name(name)), i)
+        for i, table in enumerate(self.column_tables):
+            if table >= 0:
+                table_columns[table].append(i)
+
+        neighbours = {}
+        for column, referenced in self.foreign_keys:
+            neighbours.setdefault(column, []).append(referenced)
+            neighbours.setdefault(referenced, []).append(column)
+
+        self._table_ids = table_ids
+        self._column_ids = column_ids
+        self._table_columns = [tuple(columns) for columns in table_columns]
+        self._neighbours = {
+            column: tuple(others) for column, others in neighbours.items()
+        }
+
+    def table_id(self, table):
+        """Returns the id of a table by (original or normalized) name.
+
+        Names are matched case-insensitively, as in SQLite. Raises KeyError
+        for unknown tables.
+        """
+        if isinstance(table, int):
+            return table
+        if self._table_ids is None:
+            self._build_lookups()
+        return self._table_ids[normalize_name(table)]
+
+    def column_id(self, table, column):
+        """Returns the id of a column of a table (id or name), or of `*`."""
+        table = -1 if column == "*" else self.table_id(table)
+        if self._column_ids is None:
+            self._build_lookups()
+        return self._column_ids[(table, normalize_name(column))]
+
+    def table_columns(self, table):
+        """Returns the ids of the columns of a table (id or name)."""
+        table = self.table_id(table)
+        if self._table_columns is None:
+            self._build_lookups()
+        return self._table_columns[table]
+
+    def foreign_key_neighbours(self, column_id):
+        """Returns the columns sharing a foreign key with a column."""
+        if self._neighbours is None:
+            self._build_lookups()
+        return self._neighbours.get(column_id, ())
+
+    def table_neighbours(self, table):
+        """Returns the ids of the tables linked to a table by foreign keys."""
+        tables = set()
+        for column in self.table_columns(table):
+            for other in self.foreign_key_neighbours(column):
+                tables.add(self.column_tables[other])
+        tables.discard(self.table_id(table))
+        return sorted(tables)
+
+
+def load_schemas(path):
+    """Loads the schemas of a tables.json (or tables.jsonl) file by db_id."""
+    schemas = {}
+    with open(path) as f:
+        if path.endswith(".jsonl"):
+            entries = (json.loads(line) for line in f if line.strip())
+        else:
+            entries = json.load(f)
+        for entry in entries:
+            schema = Schema.from_dict(entry)
+            schemas[schema.db_id] = schema
+    return schemas
@@ -0,0 +1,185 @@
+"""Random access to the schemas of a tables.json file by db_id.
+
+A companion index (`tables.json.index`) maps every db_id to the byte range of
+its schema, so a single schema is read without parsing the whole file.
+"""
+
+import os
+import json
+
+from unified_text2sql_benchmark.line_index import file_fingerprint
+
+INDEX_SUFFIX = ".index"
+
+
+def write_tables_json(tables, path, indent=None):
+    """Writes and indexes a tables.json file.
+
+    The file is byte for byte what `json.dump(tables, f, indent=indent)`
+    writes, so the index can be added to converters without changing outputs.
+
+    Args:
+      tables: List of schemas, each with a db_id.
+      path: Path of the tables.json file.
+      indent: JSON indentation, as in `json.dump`.
+
+    Returns:
+      The SchemaIndex of the written file.
+    """
+    ranges = {}
+    offset = 0
+    with open(path, "w", encoding="utf-8") as f:
+
+        def write(text):
+            nonlocal offset
+            f.write(text)
+            offset += len(text.encode("utf-8"))
+
+        if not tables:
+            write("[]")
+        else:
+            if indent is None:
+                prefix, separator, suffix = "", ", ", ""
+            else:
+                prefix = " " * indent if isinstance(indent, int) else indent
+                separator, suffix = ",\n", "\n"
+
+            write("[" + suffix)
+            for i, schema in enumerate(tables):
+                if i:
+                    write(separator)
+                write(prefix)
+                text = json.dumps(schema, indent=indent)
+                if indent is not None:
+                    text = text.replace("\n", "\n" + prefix)
+                start = offset
+                write(text)
+                ranges[schema["db_id"]] = (start, offset - start)
+            write(suffix + "]")
+
+    index = SchemaIndex(path, ranges)
+    index.save()
+    return index
+
+
+def scan_schema_ranges(path):
+    """Returns the byte range of every schema of a JSON list or JSONL file."""
+    ranges = {}
+    if path.endswith(".jsonl"):
+        offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    ranges[json.loads(line)["db_id"]] = (offset, len(line))
+                offset += len(line)
+        return ranges
+
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    decoder = json.JSONDecoder()
+    whitespace = " \t\n\r"
+
+    position = 0
+    offset = 0
+
+    def advance(new_position):
+        # Byte offsets differ from character positions for non-ASCII text.
+        nonlocal position, offset
+        offset += len(text[position:new_position].encode("utf-8"))
+        position = new_position
+
+    def skip_whitespace(i):
+        while i < len(text) and text[i] in whitespace:
+            i += 1
+        return i
+
+    i = skip_whitespace(0)
+    if text[i : i + 1] != "[":
+        raise ValueError(f"{path} is not a JSON list of schemas")
+    i = skip_whitespace(i + 1)
+    if text[i : i + 1] == "]":
+        return ranges
+
+    while True:
+        schema, end = decoder.raw_decode(text, i)
+        advance(i)
+        start = offset
+        advance(end)
+        ranges[schema["db_id"]] = (start, offset - start)
+
+        i = skip_whitespace(end)
+        if text[i : i + 1] == "]":
+            return ranges
+        if text[i : i + 1] != ",":
+            raise ValueError(f"Unexpected {text[i:i + 1]!r} in {path} at {i}")
+        i = skip_whitespace(i + 1)
+
+
+def build_schema_index(path):
+    """Indexes an existing tables.json (or tables.jsonl) file, e.g. a copy."""
+    index = SchemaIndex(path, scan_schema_ranges(path))
+    index.save()
+    return index
+
+
+class SchemaIndex(object):
+    """Byte ranges of the schemas of a tables.json file by db_id."""
+
+    def __init__(self, path, ranges):
+        self.path = path
+        self.ranges = ranges
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __contains__(self, db_id):
+        return db_id in self.ranges
+
+    @property
+    def db_ids(self):
+        return list(self.ranges)
+
+    def get(self, db_id):
+        """Reads and parses the schema of a db_id, raising KeyError if missing."""
+        offset, length = self.ranges[db_id]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def save(self, index_path=None):
+        index_path = index_path or self.path + INDEX_SUFFIX
+        size, mtime_ns = file_fingerprint(self.path)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(
+                {"size": size, "mtime_ns": mtime_ns, "schemas": self.ranges}, f
+            )
+        os.replace(index_path + ".tmp", index_path)
+
+    @staticmethod
+    def load(path, index_path=None):
+        """Returns the index of a tables.json file, None if missing or stale."""
+        index_path = index_path or path + INDEX_SUFFIX
+        if not os.path.exists(index_path):
+            return None
+
+        with open(index_path) as f:
+            index = json.load(f)
+        if (index["size"], index["mtime_ns"]) != file_fingerprint(path):
+            return None
+        return SchemaIndex(path, index["schemas"])
+
+    @staticmethod
+    def open(path):
+        """Loads the index of a tables.json file, building it if needed.
+
+        The index is kept in memory only if it cannot be written next to the
+        file, e.g. on a read-only copy of the benchmark.
+        """
+        index = SchemaIndex.load(path)
+        if index is None:
+            index = SchemaIndex(path, scan_schema_ranges(path))
+            try:
+                index.save()
+            except OSError:
+                pass
+        return index
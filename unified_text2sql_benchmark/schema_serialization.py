@@ -0,0 +1,251 @@
+"""Precomputed text serializations of the schemas, for prompt construction.
+
+For every db_id, three canonical serializations are built once:
+  plain: `table: column, column, ...` per table.
+  keys: column types, primary keys and foreign keys.
+  values: `keys`, with up to k sampled values of every column.
+
+They are stored in `{dataset}/schema_serializations.json`, keyed by a hash of
+the schema and of the database contents (see `database_store`), so databases
+shared by several db_ids or datasets are serialized once. Loaded
+serializations are shared by all the examples of a db_id.
+
+Usage example:
+  python3 -m unified_text2sql_benchmark.build_schema_serializations
+
+  serializations = SchemaSerializations.load("unified/spider")
+  for example in serializations.attach(dataset["dev"]):
+      prompt = example["schema_serializations"]["keys"]
+"""
+
+import os
+import json
+import random
+import sqlite3
+import hashlib
+
+from unified_text2sql_benchmark.schema import Schema
+
+SERIALIZATIONS_FILE = "schema_serializations.json"
+SERIALIZATIONS_KEY = "schema_serializations"
+
+# Number of sampled values of every column, and their maximum length.
+SAMPLE_VALUES = 3
+MAX_VALUE_LENGTH = 50
+# Part of the cache key, changed with the way values are sampled.
+SAMPLING = "reservoir"
+
+
+def schema_hash(schema, database_hash=None, sample_values=SAMPLE_VALUES):
+    """Hashes a tables.json entry, and the database its values come from."""
+    key = json.dumps(
+        {
+            "schema": schema,
+            "database": database_hash,
+            "sample_values": sample_values,
+            "sampling": SAMPLING,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def reservoir_sample(rows, k, rng):
+    """Returns a uniform sample of k rows, in the order of the rows."""
+    reservoir = []
+    for index, row in enumerate(rows):
+        if index < k:
+            reservoir.append((index, row))
+        else:
+            slot = rng.randrange(index + 1)
+            if slot < k:
+                reservoir[slot] = (index, row)
+    return [row for index, row in sorted(reservoir)]
+
+
+def sample_column_values(schema, database_path, k=SAMPLE_VALUES):
+    """Returns up to k distinct values of every column, by column id.
+
+    Values are sampled uniformly among the distinct values of the column, with
+    a seed derived from its table and column names, so a database is always
+    serialized with the same values.
+    """
+    values = {}
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    conn.text_factory = lambda b: b.decode("utf-8", errors="replace")
+    try:
+        for column_id, table in enumerate(schema.column_tables):
+            if table < 0:
+                continue
+            table_name = schema.table_names_original[table]
+            column_name = schema.column_names_original[column_id]
+            try:
+                rows = reservoir_sample(
+                    conn.execute(
+                        f"SELECT DISTINCT {quote(column_name)} "
+                        f"FROM {quote(table_name)} "
+                        f"WHERE {quote(column_name)} IS NOT NULL"
+                    ),
+                    k,
+                    random.Random(f"{table_name}/{column_name}"),
+                )
+            except sqlite3.Error:
+                continue
+            values[column_id] = [row[0] for row in rows]
+    finally:
+        conn.close()
+    return values
+
+
+def format_value(value):
+    if isinstance(value, bytes):
+        return "<blob>"
+    if isinstance(value, str):
+        if len(value) > MAX_VALUE_LENGTH:
+            value = value[:MAX_VALUE_LENGTH] + "..."
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def serialize_schema(schema, values=None):
+    """Returns the serializations of a `Schema`.
+
+    Args:
+      schema: The `Schema` to serialize, with its original names.
+      values: Sampled values by column id, for the `values` serialization.
+
+    Returns:
+      A {"plain", "keys"[, "values"]} dictionary.
+    """
+    primary_keys = set()
+    for key in schema.primary_keys:
+        primary_keys.update(key if isinstance(key, tuple) else [key])
+    references = {}
+    for column, referenced in schema.foreign_keys:
+        table = schema.column_tables[referenced]
+        references.setdefault(column, []).append(
+            f"{schema.table_names_original[table]}."
+            f"{schema.column_names_original[referenced]}"
+        )
+
+    def describe(column_id, with_values):
+        annotations = [schema.column_type(column_id)]
+        if column_id in primary_keys:
+            annotations.append("primary key")
+        for reference in references.get(column_id, []):
+            annotations.append(f"references {reference}")
+        description = ", ".join(annotations)
+        if with_values and values.get(column_id):
+            formatted = ", ".join(format_value(v) for v in values[column_id])
+            description += f"; values: {formatted}"
+        return f"{schema.column_names_original[column_id]} ({description})"
+
+    serializations = {"plain": [], "keys": []}
+    if values is not None:
+        serializations["values"] = []
+    for table, table_name in enumerate(schema.table_names_original):
+        columns = schema.table_columns(table)
+        serializations["plain"].append(
+            f"{table_name}: "
+            + ", ".join(schema.column_names_original[c] for c in columns)
+        )
+        serializations["keys"].append(
+            f"{table_name}: " + ", ".join(describe(c, False) for c in columns)
+        )
+        if values is not None:
+            serializations["values"].append(
+                f"{table_name}: "
+                + ", ".join(describe(c, True) for c in columns)
+            )
+    return {name: "\n".join(lines) for name, lines in serializations.items()}
+
+
+def build_serializations(dataset, sample_values=SAMPLE_VALUES, cache=None):
+    """Serializes the schemas of a `Dataset`, and writes them next to it.
+
+    Args:
+      dataset: The `Dataset` to serialize the schemas of.
+      sample_values: Number of sampled values per column, 0 to skip the
+        `values` serialization (and reading the databases).
+      cache: {hash: serializations} of already serialized schemas, e.g. of
+        other datasets, updated with the new ones.
+
+    Returns:
+      The SchemaSerializations of the dataset.
+    """
+    cache = {} if cache is None else cache
+    db_ids = {}
+    serializations = {}
+    for db_id, schema in dataset.schemas.items():
+        database_hash = None
+        if sample_values:
+            try:
+                database_hash = dataset.database_hash(db_id)
+            except FileNotFoundError:
+                pass
+        key = schema_hash(schema, database_hash, sample_values)
+        if key not in cache:
+            compact_schema = Schema.from_dict(schema)
+            values = None
+            if database_hash is not None:
+                values = sample_column_values(
+                    compact_schema, dataset.database_path(db_id), sample_values
+                )
+            cache[key] = serialize_schema(compact_schema, values)
+        db_ids[db_id] = key
+        serializations[key] = cache[key]
+
+    result = SchemaSerializations(db_ids, serializations, sample_values)
+    result.save(os.path.join(dataset.path, SERIALIZATIONS_FILE))
+    return result
+
+
+class SchemaSerializations(object):
+    """Serializations of the schemas of a dataset, by db_id."""
+
+    def __init__(self, db_ids, serializations, sample_values=SAMPLE_VALUES):
+        self.db_ids = db_ids
+        self.serializations = serializations
+        self.sample_values = sample_values
+
+    def __contains__(self, db_id):
+        return db_id in self.db_ids
+
+    def __getitem__(self, db_id):
+        """Returns the {"plain", "keys"[, "values"]} serializations."""
+        return self.serializations[self.db_ids[db_id]]
+
+    def attach(self, examples, key=SERIALIZATIONS_KEY):
+        """Adds the serializations of their db_id to examples, by reference.
+
+        Examples of the same db_id share the same dictionary, which must not
+        be modified.
+        """
+        for example in examples:
+            example[key] = self[example["db_id"]]
+            yield example
+
+    def save(self, path):
+        with open(path + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "sample_values": self.sample_values,
+                    "db_ids": self.db_ids,
+                    "serializations": self.serializations,
+                },
+                f,
+            )
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def load(dataset_dir):
+        """Loads the serializations built for a dataset folder."""
+        with open(os.path.join(dataset_dir, SERIALIZATIONS_FILE)) as f:
+            data = json.load(f)
+        return SchemaSerializations(
+            data["db_ids"], data["serializations"], data["sample_values"]
+        )
@@ -0,0 +1,255 @@
+"""Full-text index of the cell values of the databases, for value linking.
+
+The distinct text values of every column of the databases of a dataset are
+packed into a single SQLite file (`{dataset}/value_index.sqlite`) with two
+FTS5 indexes: words (`unicode61`) and, for fuzzy matches, trigrams. Finding
+the cells mentioned by a question is then an index probe instead of a scan
+of every table.
+
+Usage example:
+  python3 -m unified_text2sql_benchmark.build_value_indexes --datasets spider
+
+  index = ValueIndex.open("unified/spider")
+  index.search("How many singers are from France?", "concert_singer")
+"""
+
+import os
+import re
+import sqlite3
+from contextlib import nullcontext
+from multiprocessing import Pool
+
+from unified_text2sql_benchmark.schema import Schema
+
+VALUE_INDEX_FILE = "value_index.sqlite"
+
+# Longer values are not indexed, they are rarely mentioned in questions.
+MAX_VALUE_LENGTH = 256
+
+# Trigram tokenizer of SQLite >= 3.34, which matches any substring of at
+# least 3 characters.
+MIN_TRIGRAM_LENGTH = 3
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+CREATE_STATEMENTS = [
+    """CREATE TABLE cells (
+        id INTEGER PRIMARY KEY,
+        db_id TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        column_name TEXT NOT NULL,
+        value TEXT NOT NULL
+    )""",
+    # The cells of a database are contiguous, so that searches are
+    # restricted to its range of rowids.
+    """CREATE TABLE databases (
+        db_id TEXT PRIMARY KEY,
+        first_id INTEGER NOT NULL,
+        last_id INTEGER NOT NULL
+    )""",
+    """CREATE VIRTUAL TABLE cells_words USING fts5(
+        value, content='cells', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+]
+CREATE_TRIGRAM_STATEMENTS = [
+    """CREATE VIRTUAL TABLE cells_trigrams USING fts5(
+        value, content='cells', content_rowid='id', tokenize='trigram'
+    )"""
+]
+
+
+def quote_identifier(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def quote_string(text):
+    """Quotes a string for an FTS5 query."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def get_database_cells(args):
+    """Returns the distinct text values of every column of a database.
+
+    Args:
+      args: (db_id, tables.json entry, database path) tuple.
+
+    Returns:
+      A list of (db_id, table name, column name, value) tuples.
+    """
+    db_id, schema, database_path = args
+    schema = Schema.from_dict(schema)
+    cells = []
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    conn.text_factory = lambda b: b.decode("utf-8", errors="replace")
+    try:
+        for column_id, table in enumerate(schema.column_tables):
+            if table < 0:
+                continue
+            table_name = schema.table_names_original[table]
+            column_name = schema.column_names_original[column_id]
+            column = quote_identifier(column_name)
+            try:
+                rows = conn.execute(
+                    f"SELECT DISTINCT {column} "
+                    f"FROM {quote_identifier(table_name)} "
+                    f"WHERE typeof({column}) = 'text' "
+                    f"AND length({column}) <= {MAX_VALUE_LENGTH}"
+                ).fetchall()
+            except sqlite3.Error:
+                continue
+            cells.extend(
+                (db_id, table_name, column_name, value)
+                for (value,) in rows
+                if value.strip()
+            )
+    finally:
+        conn.close()
+    return cells
+
+
+def build_value_index(dataset, trigrams=True, workers=1):
+    """Indexes the cell values of all the databases of a `Dataset`.
+
+    Args:
+      dataset: The `Dataset` to index.
+      trigrams: Whether to also build the trigram index for fuzzy matches.
+      workers: Number of processes reading the databases.
+
+    Returns:
+      The path of the written index.
+    """
+    path = os.path.join(dataset.path, VALUE_INDEX_FILE)
+    if os.path.exists(path + ".tmp"):
+        os.unlink(path + ".tmp")
+
+    work = []
+    for db_id, schema in dataset.schemas.items():
+        try:
+            work.append((db_id, schema, dataset.database_path(db_id)))
+        except FileNotFoundError:
+            continue
+
+    conn = sqlite3.connect(path + ".tmp")
+    try:
+        for statement in CREATE_STATEMENTS + (
+            CREATE_TRIGRAM_STATEMENTS if trigrams else []
+        ):
+            conn.execute(statement)
+        first_id = 1
+        with Pool(workers) if workers > 1 else nullcontext() as pool:
+            imap = pool.imap_unordered if pool else map
+            for cells in imap(get_database_cells, work):
+                if not cells:
+                    continue
+                conn.executemany(
+                    "INSERT INTO cells (id, db_id, table_name, column_name, "
+                    "value) VALUES (?, ?, ?, ?, ?)",
+                    ((first_id + i, *cell) for i, cell in enumerate(cells)),
+                )
+                last_id = first_id + len(cells) - 1
+                conn.execute(
+                    "INSERT INTO databases VALUES (?, ?, ?)",
+                    (cells[0][0], first_id, last_id),
+                )
+                first_id = last_id + 1
+        conn.execute("INSERT INTO cells_words(cells_words) VALUES('rebuild')")
+        if trigrams:
+            conn.execute(
+                "INSERT INTO cells_trigrams(cells_trigrams) VALUES('rebuild')"
+            )
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(path + ".tmp", path)
+    return path
+
+
+class ValueIndex(object):
+    """Searches the cell values of the databases of a dataset."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._pid = None
+        self._trigrams = None
+
+    @staticmethod
+    def open(dataset_dir):
+        path = os.path.join(dataset_dir, VALUE_INDEX_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"No value index at {path}, see build_value_indexes"
+            )
+        return ValueIndex(path)
+
+    @property
+    def conn(self):
+        # Connections must not be shared with forked worker processes.
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._pid = os.getpid()
+        return self._conn
+
+    @property
+    def has_trigrams(self):
+        if self._trigrams is None:
+            self._trigrams = bool(
+                self.conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'cells_trigrams'"
+                ).fetchone()
+            )
+        return self._trigrams
+
+    def search(self, question, db_id, limit=10, fuzzy=False):
+        """Returns the cells of a database best matching a question.
+
+        Args:
+          question: Natural language question, or any text.
+          db_id: Database to search the cells of.
+          limit: Maximum number of cells returned.
+          fuzzy: Whether to match the trigrams of the words of the question
+            rather than whole words, e.g. for misspelled values.
+
+        Returns:
+          A list of {"table", "column", "value", "score"} dictionaries, by
+          decreasing BM25 score.
+        """
+        words = WORD_PATTERN.findall(question)
+        index = "cells_words"
+        if fuzzy:
+            if not self.has_trigrams:
+                raise ValueError(f"{self.path} has no trigram index")
+            index = "cells_trigrams"
+            # Cells sharing more trigrams with the question rank higher, so
+            # misspelled values still match.
+            words = [
+                word[i : i + MIN_TRIGRAM_LENGTH].lower()
+                for word in words
+                for i in range(len(word) - MIN_TRIGRAM_LENGTH + 1)
+            ]
+        ids = self.conn.execute(
+            "SELECT first_id, last_id FROM databases WHERE db_id = ?", (db_id,)
+        ).fetchone()
+        if not words or ids is None:
+            return []
+
+        query = " OR ".join(map(quote_string, dict.fromkeys(words)))
+        rows = self.conn.execute(
+            f"SELECT cells.table_name, cells.column_name, cells.value, "
+            f"bm25({index}) AS score "
+            f"FROM {index} JOIN cells ON cells.id = {index}.rowid "
+            f"WHERE {index} MATCH ? AND {index}.rowid BETWEEN ? AND ? "
+            f"ORDER BY score LIMIT ?",
+            (query, *ids, limit),
+        ).fetchall()
+        return [
+            {"table": table, "column": column, "value": value, "score": -score}
+            for table, column, value, score in rows
+        ]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None